@@ -0,0 +1,357 @@
+import os
+import sys
+import time
+import json
+import random
+import argparse
+import platform
+import subprocess
+import tempfile
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from threading import Thread, Lock
+
+from form_filler import FormFillerEngine, BLOCK_PROFILES, BLOCK_READY_SCRIPT, FORM_HOST
+
+DEFAULT_SIZES = [100, 3000, 100000]
+BENCH_PASSWORD = "bench"
+
+FIRST_NAMES = ["Connie", "Frederick", "Martin", "Luke", "Dale", "Ruth", "Alice", "Omar", "Priya", "Sven"]
+LAST_NAMES = ["Chapman", "West", "Kelley", "Hawkins", "Hill", "Moreno", "Ito", "Novak", "Reyes", "Stone"]
+
+LOGIN_PAGE = """<!doctype html>
+<html><body>
+<h1>Sign in</h1>
+<form method="post" action="/login">
+  <input type="password" name="password">
+  <button type="submit">Enter</button>
+</form>
+</body></html>
+"""
+
+FORM_PAGE = f"""<!doctype html>
+<html><body>
+<h1>Entries</h1>
+<iframe src="/{FORM_HOST}/form" width="900" height="700"></iframe>
+</body></html>
+"""
+
+# Same layout as the live form: per block element_{6n}..element_{6n+4} are fields
+# (element_{6n+2} is the gender select) and element_{6n+5} is the block heading.
+# Blocks are appended as the last ones get filled, like a repeating section.
+IFRAME_FORM = f"""<!doctype html>
+<html><body>
+<form id="entries" method="post" action="/{FORM_HOST}/form">
+<div id="blocks"></div>
+<button type="submit">Submit</button>
+</form>
+<script>
+const form = document.getElementById('entries');
+const container = document.getElementById('blocks');
+const BATCH = 50;
+let blocks = 0;
+function addBlocks(count) {{
+  const html = [];
+  for (let n = blocks; n < blocks + count; n++) {{
+    const b = n * 6;
+    html.push(`<div class="block">
+      <input type="text" id="element_${{b}}" name="element_${{b}}">
+      <input type="text" id="element_${{b + 1}}" name="element_${{b + 1}}">
+      <select id="element_${{b + 2}}" name="element_${{b + 2}}"><option value=""></option>
+        <option value="Male">Male</option><option value="Female">Female</option></select>
+      <input type="text" id="element_${{b + 3}}" name="element_${{b + 3}}">
+      <input type="text" id="element_${{b + 4}}" name="element_${{b + 4}}">
+      <h3 id="element_${{b + 5}}">Entry ${{n + 2}}</h3>
+    </div>`);
+  }}
+  container.insertAdjacentHTML('beforeend', html.join(''));
+  blocks += count;
+}}
+function onEdit(event) {{
+  const n = Math.floor(parseInt(event.target.id.slice(8), 10) / 6);
+  if (n >= blocks - BATCH / 2) addBlocks(BATCH);
+}}
+form.addEventListener('input', onEdit);
+form.addEventListener('change', onEdit);
+addBlocks(BATCH);
+</script>
+</body></html>
+"""
+
+
+class FormHandler(BaseHTTPRequestHandler):
+    def send_page(self, body, status=200, headers=()):
+        data = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == f"/{FORM_HOST}/form":
+            self.send_page(IFRAME_FORM)
+        elif self.path == "/":
+            logged_in = "bench_session=1" in self.headers.get("Cookie", "")
+            self.send_page(FORM_PAGE if logged_in else LOGIN_PAGE)
+        else:
+            self.send_page("Not found", status=404)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length).decode('utf-8')
+        if self.path == "/login" and f"password={BENCH_PASSWORD}" in body:
+            self.send_page("", status=303, headers=[("Location", "/"), ("Set-Cookie", "bench_session=1; Path=/")])
+        elif self.path == f"/{FORM_HOST}/form":
+            self.send_page("<!doctype html><html><body><p>Thank you.</p></body></html>")
+        else:
+            self.send_page(LOGIN_PAGE, status=403)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FormHandler)
+    Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def write_csv(path, rows, seed=0):
+    rng = random.Random(seed)
+    with open(path, 'w', newline='') as f:
+        for _ in range(rows):
+            f.write(f"{rng.choice(FIRST_NAMES)},{rng.choice(LAST_NAMES)},{rng.choice(['Male', 'Female'])},"
+                    f"{rng.randint(18, 80)},{rng.randint(100, 999)}-{rng.randint(0, 9999):04d}-{rng.randint(0, 99):02d}\n")
+
+
+class FieldTimings:
+    # Wall time per fill call, keyed by column name (or 'batch' for one-call block fills)
+    def __init__(self):
+        self._lock = Lock()
+        self.samples = {}
+
+    def record(self, key, seconds):
+        with self._lock:
+            self.samples.setdefault(key, []).append(seconds)
+
+    def summary(self):
+        result = {}
+        for key, values in sorted(self.samples.items()):
+            values.sort()
+            result[key] = {
+                'count': len(values),
+                'p50_ms': round(values[int(0.50 * (len(values) - 1))] * 1000, 2),
+                'p95_ms': round(values[int(0.95 * (len(values) - 1))] * 1000, 2),
+            }
+        return result
+
+
+class TimedLocator:
+    # Measures from locator creation (before the visibility wait) to the end of the fill
+    def __init__(self, locator, key, timings):
+        self._locator = locator
+        self._key = key
+        self._timings = timings
+        self._started = time.perf_counter()
+
+    def fill(self, *args, **kwargs):
+        result = self._locator.fill(*args, **kwargs)
+        self._timings.record(self._key, time.perf_counter() - self._started)
+        return result
+
+    def select_option(self, *args, **kwargs):
+        result = self._locator.select_option(*args, **kwargs)
+        self._timings.record(self._key, time.perf_counter() - self._started)
+        return result
+
+    def __getattr__(self, name):
+        return getattr(self._locator, name)
+
+
+class TimedFrame:
+    def __init__(self, frame, engine, timings):
+        self._frame = frame
+        self._engine = engine
+        self._timings = timings
+
+    def locator(self, selector):
+        return TimedLocator(self._frame.locator(selector), self._engine.field_key(selector), self._timings)
+
+    def evaluate(self, expression, *args, **kwargs):
+        started = time.perf_counter()
+        result = self._frame.evaluate(expression, *args, **kwargs)
+        self._timings.record('ready' if expression == BLOCK_READY_SCRIPT else 'batch', time.perf_counter() - started)
+        return result
+
+    def __getattr__(self, name):
+        return getattr(self._frame, name)
+
+
+class BenchmarkEngine(FormFillerEngine):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.timings = FieldTimings()
+        self.fill_started = None
+
+    # Filling starts once login (and its settle wait) is done
+    def login(self, page):
+        logged_in = super().login(page)
+        self.fill_started = time.perf_counter()
+        return logged_in
+
+    def field_key(self, selector):
+        element_id = selector.rsplit('#', 1)[-1]
+        offset = int(element_id[len(self.plan.id_prefix):]) % self.plan.stride
+        for field_plan in self.plan.fields:
+            if field_plan.offset == offset:
+                return self.columns[field_plan.column]
+        return 'other'
+
+    def find_form_frame(self, page):
+        return TimedFrame(super().find_form_frame(page), self, self.timings)
+
+
+def peak_rss_kb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    # ru_maxrss is KB on Linux and bytes on macOS; children is the largest single reaped child
+    scale = 1024 if sys.platform == 'darwin' else 1
+    return {
+        'python': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // scale,
+        'children': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss // scale,
+    }
+
+
+def run_case(rows, args):
+    server = start_server()
+    url = f"http://127.0.0.1:{server.server_address[1]}/"
+    with tempfile.TemporaryDirectory() as work_dir:
+        csv_path = os.path.join(work_dir, f"bench_{rows}.csv")
+        write_csv(csv_path, rows, seed=args.seed)
+        engine = BenchmarkEngine(
+            file_path=csv_path,
+            website_url=url,
+            password=BENCH_PASSWORD,
+            delay_time=0,
+            between_forms_delay=0,
+            max_retries=args.max_retries,
+            headless=not args.headed,
+            workers=args.workers,
+            batch_fill=args.batch_fill,
+            session_cache=False,
+            adaptive_pacing=args.adaptive_pacing,
+            block_profile=args.block_profile,
+            window_size=args.window,
+            lookahead=args.lookahead,
+            replay=args.replay,
+            replay_success="Thank you" if args.replay else None,
+            log_level='errors',
+            prompt_callback=lambda kind, message: True,
+        )
+        started = time.perf_counter()
+        summary = engine.run()
+        finished = time.perf_counter()
+        elapsed = finished - started
+        fill_started = engine.fill_started or started
+        fill_elapsed = finished - fill_started
+    server.shutdown()
+    return {
+        'rows': rows,
+        'workers': args.workers,
+        'batch_fill': args.batch_fill,
+        'adaptive_pacing': args.adaptive_pacing,
+        'block_profile': args.block_profile,
+        'window': args.window,
+        'replay': args.replay,
+        'lookahead': args.lookahead,
+        'success': summary['success'],
+        'failure': summary['failure'],
+        'seconds': round(elapsed, 3),
+        'startup_seconds': round(fill_started - started, 3),
+        'fill_seconds': round(fill_elapsed, 3),
+        'rows_per_sec': round(summary['success'] / fill_elapsed, 3) if fill_elapsed else None,
+        'fields': engine.timings.summary(),
+        'peak_rss_kb': peak_rss_kb(),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Measure form filling throughput against a local stand-in form")
+    parser.add_argument("--rows", type=int, nargs="+", default=DEFAULT_SIZES,
+                        help="Row counts to benchmark, one generated CSV each")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--batch-fill", action="store_true")
+    parser.add_argument("--adaptive-pacing", action="store_true")
+    parser.add_argument("--block-profile", choices=list(BLOCK_PROFILES), default="off")
+    parser.add_argument("--window", type=int, default=0, help="Submit and reload the form every N entries")
+    parser.add_argument("--lookahead", type=int, default=0, help="Form blocks waited for ahead of the current one")
+    parser.add_argument("--replay", action="store_true", help="Post entries over HTTP after recording the form post")
+    parser.add_argument("--max-retries", type=int, default=3)
+    parser.add_argument("--headed", action="store_true", help="Show the browser window")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the generated CSV data")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    parser.add_argument("--case", type=int, help=argparse.SUPPRESS)
+    return parser
+
+
+def case_args(args):
+    flags = ["--workers", str(args.workers), "--window", str(args.window), "--lookahead", str(args.lookahead),
+             "--max-retries", str(args.max_retries), "--block-profile", args.block_profile, "--seed", str(args.seed)]
+    for name in ("batch_fill", "adaptive_pacing", "replay", "headed"):
+        if getattr(args, name):
+            flags.append("--" + name.replace("_", "-"))
+    return flags
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    if args.case is not None:
+        # Child process: one size per process so peak RSS is per case
+        try:
+            result = run_case(args.case, args)
+        except Exception as e:
+            result = {'rows': args.case, 'error': str(e).splitlines()[0]}
+        print(json.dumps(result))
+        return 0 if 'error' not in result else 1
+
+    cases = []
+    for rows in args.rows:
+        print(f"Benchmarking {rows} rows...", file=sys.stderr, flush=True)
+        result = subprocess.run([sys.executable, os.path.abspath(__file__), "--case", str(rows)] + case_args(args),
+                                capture_output=True, text=True)
+        output = result.stdout.strip().splitlines()
+        if output:
+            cases.append(json.loads(output[-1]))
+        else:
+            cases.append({'rows': rows, 'error': f"benchmark process exited with {result.returncode}"})
+
+    report = {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'created': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'cases': cases,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 0 if all('error' not in case for case in cases) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
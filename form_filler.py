@@ -2,29 +2,3083 @@ import os
 import sys
 import time
 import logging
-import pandas as pd
+import logging.handlers
+import atexit
+import argparse
+import importlib
 import csv
+import itertools
+import hashlib
+import sqlite3
 import json
+import queue
+import socket
+import asyncio
+import contextvars
+import fnmatch
+import heapq
+import random
+import bisect
+import shutil
+import tempfile
+import http.client
+import email.message
+import email.parser
+import email.policy
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait as wait_futures, FIRST_COMPLETED
+from contextlib import contextmanager
+from urllib.parse import urlsplit, urlencode, parse_qsl
+from functools import partial
 from datetime import datetime
-from playwright.sync_api import sync_playwright, TimeoutError as PlaywrightTimeoutError
-import tkinter as tk
-from tkinter import filedialog, ttk, messagebox, simpledialog
-from threading import Thread, Event
-
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    filename='form_filler.log',
-    filemode='a'
-)
+from threading import Thread, Event, Lock, local
+
+
+class LazyModule:
+    # Imports the module on first attribute access, so `--help`, `check` and
+    # `index` start without loading Playwright or Tkinter, and `index` without pandas
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+
+pd = LazyModule("pandas")
+sync_api = LazyModule("playwright.sync_api")
+async_api = LazyModule("playwright.async_api")
+tk = LazyModule("tkinter")
+ttk = LazyModule("tkinter.ttk")
+filedialog = LazyModule("tkinter.filedialog")
+messagebox = LazyModule("tkinter.messagebox")
+simpledialog = LazyModule("tkinter.simpledialog")
+
 logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+# How much detail goes to the log file and the progress window
+LOG_LEVELS = {
+    'field': logging.DEBUG,    # every field lookup and fill
+    'entry': logging.INFO,     # one or two lines per entry
+    'errors': logging.WARNING, # retries, failures and errors only
+}
+MAX_LOG_LINES = 1000  # Lines kept in the GUI log window
+UI_QUEUE_BATCH = 500  # Queue items handled per GUI refresh
+
+
+def setup_logging(log_file='form_filler.log'):
+    # Records are handed to a QueueListener thread, so the automation never waits on disk I/O
+    log_queue = queue.Queue(-1)
+    file_handler = logging.FileHandler(log_file, mode='a')
+    file_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+    listener = logging.handlers.QueueListener(log_queue, file_handler, respect_handler_level=True)
+    root_logger = logging.getLogger()
+    root_logger.setLevel(logging.INFO)
+    root_logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
+
+FORM_HOST = "emailmeform.com"
+FORM_IFRAME_SELECTOR = f'iframe[src*="{FORM_HOST}"]'
+DEFAULT_HEADERS = ['first_name', 'last_name', 'gender', 'age', 'id']
+# Data file formats by extension; anything else is read as CSV
+FILE_TYPES = {
+    '.csv': 'csv', '.txt': 'csv',
+    '.parquet': 'parquet', '.pq': 'parquet',
+    '.arrow': 'arrow', '.feather': 'arrow', '.ipc': 'arrow',
+    '.jsonl': 'jsonl', '.ndjson': 'jsonl',
+}
+
+# Pre-flight checks: accepted spellings of the form's gender options (lowercase),
+# the ID/phone format and the age range
+GENDER_VALUES = {
+    'male': 'Male', 'm': 'Male', 'man': 'Male',
+    'female': 'Female', 'f': 'Female', 'woman': 'Female',
+}
+ID_PATTERN = r'\d{3}-\d{4}-\d{2}'
+MAX_AGE = 120
+PREFLIGHT_MODES = ('quarantine', 'report', 'off')
+
+# Built-in form mapping, same format as a --mapping file.
+# Each form block: 5 fields (element_{base} to element_{base+4}), then h3 (element_{base+5})
+DEFAULT_MAPPING = {
+    'stride': 6,
+    'id_prefix': 'element_',
+    'fields': [
+        {'column': 0, 'offset': 0, 'type': 'text'},    # First Name  -> element_{base+0}
+        {'column': 1, 'offset': 1, 'type': 'text'},    # Last Name   -> element_{base+1}
+        {'column': 2, 'offset': 2, 'type': 'select'},  # Gender      -> element_{base+2}
+        {'column': 3, 'offset': 3, 'type': 'text'},    # Age         -> element_{base+3}
+        {'column': 4, 'offset': 4, 'type': 'text'},    # ID/Phone    -> element_{base+4}
+    ],
+}
+SELECT_STRATEGIES = ('auto', 'value', 'label')
+
+# [value, label] of every option of a select element
+SELECT_OPTIONS_SCRIPT = "(element) => Array.from(element.options).map(o => [o.value, o.label.trim()])"
+
+# Fills a whole form block in one round-trip. Takes [element_id, type, value, select_by]
+# entries and returns one {id, status} per field; anything other than
+# "filled"/"selected" is reported back so the caller can fall back or fail.
+BATCH_FILL_SCRIPT = """
+(fields) => fields.map(([id, type, value, selectBy]) => {
+    const el = document.getElementById(id);
+    if (!el || !['INPUT', 'SELECT', 'TEXTAREA'].includes(el.tagName)) {
+        return {id, status: 'missing'};
+    }
+    if (el.disabled || el.readOnly) {
+        return {id, status: 'disabled'};
+    }
+    const fire = () => {
+        el.dispatchEvent(new Event('input', {bubbles: true}));
+        el.dispatchEvent(new Event('change', {bubbles: true}));
+    };
+    if (type === 'select' && el.tagName === 'SELECT') {
+        const options = Array.from(el.options);
+        const byValue = selectBy !== 'label' && options.find(o => o.value === value);
+        const byLabel = selectBy !== 'value' && options.find(o => o.label.trim() === value);
+        const match = byValue || byLabel;
+        if (!match) {
+            return {id, status: 'no_option'};
+        }
+        el.value = match.value;
+        fire();
+        return {id, status: 'selected', value: match.value};
+    }
+    // Use the native setter so framework-managed inputs see the change
+    const proto = el.tagName === 'TEXTAREA' ? HTMLTextAreaElement.prototype
+        : el.tagName === 'SELECT' ? HTMLSelectElement.prototype : HTMLInputElement.prototype;
+    el.focus();
+    Object.getOwnPropertyDescriptor(proto, 'value').set.call(el, value);
+    fire();
+    el.blur();
+    return {id, status: el.value === value ? 'filled' : 'rejected'};
+})
+"""
+BATCH_FALLBACK_STATUSES = ('missing', 'disabled', 'rejected')
+
+# Lookahead: starts an in-page wait for each block's fields to be visible, so
+# later blocks get ready while the current one is filled, and returns the
+# (usually already settled) wait of the current block. A reloaded form starts
+# with no waits, and the current block gets null if it could not be armed.
+BLOCK_READY_SCRIPT = """
+([slot, blocks, timeout]) => {
+    const ready = window.__formFillerReady || (window.__formFillerReady = {});
+    const visible = (ids) => ids.every(id => {
+        const el = document.getElementById(id);
+        return el && el.getClientRects().length > 0 && getComputedStyle(el).visibility !== 'hidden';
+    });
+    for (const [key, ids] of blocks) {
+        if (key in ready) continue;
+        ready[key] = new Promise(resolve => {
+            if (visible(ids)) return resolve(true);
+            const observer = new MutationObserver(() => {
+                if (visible(ids)) {
+                    observer.disconnect();
+                    resolve(true);
+                }
+            });
+            observer.observe(document, {childList: true, subtree: true, attributes: true});
+            setTimeout(() => {
+                observer.disconnect();
+                resolve(visible(ids));
+            }, timeout);
+        });
+    }
+    return slot in ready ? ready[slot] : null;
+}
+"""
+
+# Prefix for log lines of the current worker thread or asyncio task
+log_prefix = contextvars.ContextVar("log_prefix", default="")
+
+# Logged-in browser state saved by earlier runs
+SESSION_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".form_filler", "sessions")
+SUBMITTED_INDEX_PATH = os.path.join(os.path.expanduser("~"), ".form_filler", "submitted.sqlite")
+# Something that only shows up once logged in
+LOGGED_IN_SELECTOR = f"{FORM_IFRAME_SELECTOR}, #element_0"
+
+# Requests the form never needs. A --block-profile file uses the same keys.
+BLOCK_PROFILES = {
+    'off': None,
+    'default': {
+        'resource_types': ['image', 'media', 'font'],
+        'url_patterns': [
+            '*://*.google-analytics.com/*', '*://*.googletagmanager.com/*', '*://*.doubleclick.net/*',
+            '*://*.googlesyndication.com/*', '*://*.facebook.net/*', '*://*.hotjar.com/*',
+            '*://*.clarity.ms/*', '*://*.adservice.google.com/*',
+        ],
+        'allow_hosts': [FORM_HOST],
+    },
+}
+
+# How a failed attempt is classified. Timeouts and unexpected errors are retried
+# later with backoff; the others cannot succeed on retry and go to the dead-letter file.
+FAILURE_TIMEOUT = 'timeout'
+FAILURE_ELEMENT_MISSING = 'element_missing'
+FAILURE_SELECT_MISMATCH = 'select_mismatch'
+FAILURE_ERROR = 'error'
+FAILURE_SUBMIT = 'submit'
+PERMANENT_FAILURES = (FAILURE_ELEMENT_MISSING, FAILURE_SELECT_MISMATCH)
+
+# Windowed mode: submits the form every N blocks, then reloads it empty
+SUBMIT_SELECTOR = 'input[type="submit"], button[type="submit"]'
+
+# Empties a block whose entry failed, so a windowed submit never sends half an entry
+CLEAR_BLOCK_SCRIPT = """
+(ids) => ids.forEach(id => {
+    const el = document.getElementById(id);
+    if (!el) return;
+    el.value = '';
+    el.dispatchEvent(new Event('input', { bubbles: true }));
+    el.dispatchEvent(new Event('change', { bubbles: true }));
+})
+"""
+
+# HTTP replay: statuses meaning the session or the form's tokens went stale
+REPLAY_AUTH_STATUSES = (401, 403, 419, 440)
+REPLAY_MAX_REFRESHES = 3  # Token refreshes in a row without a successful post
+# Request headers that belong to one connection and are not replayed
+REPLAY_DROP_HEADERS = {'host', 'content-length', 'cookie', 'connection', 'keep-alive',
+                       'accept-encoding', 'transfer-encoding'}
+FIELD_NAMES_SCRIPT = """
+(blocks) => blocks.map(ids => ids.map(id => {
+    const el = document.getElementById(id);
+    return el ? (el.name || id) : null;
+}))
+"""
+HIDDEN_FIELDS_SCRIPT = "() => Array.from(document.querySelectorAll('input[type=hidden][name]')).map(el => [el.name, el.value])"
+
+# Upper bounds (seconds) of the stage timing histogram buckets
+METRIC_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# Prompt kinds the engine may raise while logging in
+PROMPT_CONFIRM_LOGIN = "confirm_login"
+PROMPT_MANUAL_LOGIN = "manual_login"
+
+
+def file_type_for(path):
+    return FILE_TYPES.get(os.path.splitext(path)[1].lower(), 'csv')
+
+
+def import_pyarrow():
+    # Optional: only Parquet and Arrow input need it
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError as e:
+        raise FormFillerError("Reading Parquet or Arrow files needs pyarrow (pip install pyarrow)") from e
+    return pyarrow
+
+
+def as_text(frame):
+    # Typed columns (ints, floats, dates) become strings like CSV cells; missing stays NaN
+    frame = frame.astype(object)
+    return frame.where(frame.isna(), frame.astype(str))
+
+
+class FormFillerError(Exception):
+    pass
+
+
+class FillFailure(FormFillerError):
+    # A failed fill attempt with its FAILURE_* kind
+    def __init__(self, kind, message):
+        super().__init__(message)
+        self.kind = kind
+
+
+def classify_failure(error):
+    if isinstance(error, FillFailure):
+        return error.kind
+    if isinstance(error, sync_api.TimeoutError):
+        return FAILURE_TIMEOUT
+    return FAILURE_ERROR
+
+
+class CheckpointJournal:
+    # Append-only JSONL record of finished rows, kept next to the data file.
+    # Writes are fsynced in batches, so a crash loses at most the last few
+    # outcomes and a torn final line is simply ignored on load.
+    def __init__(self, path, sync_every=25, sync_interval=2.0):
+        self.path = path
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        self._file = None
+        self._pending = 0
+        self._last_sync = time.monotonic()
+        self._lock = Lock()
+
+    def load(self):
+        # Last outcome per row index
+        outcomes = {}
+        if not os.path.exists(self.path):
+            return outcomes
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if 'idx' in entry:
+                    outcomes[entry['idx']] = entry['status']
+        return outcomes
+
+    def finished_rows(self, requeue_failed=False):
+        return {idx for idx, status in self.load().items()
+                if status == 'ok' or not requeue_failed}
+
+    def open(self, resume):
+        torn = False
+        if resume and os.path.exists(self.path) and os.path.getsize(self.path) > 0:
+            with open(self.path, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                torn = f.read(1) != b"\n"
+        self._file = open(self.path, 'a' if resume else 'w', encoding='utf-8')
+        if torn:
+            # Terminate a line cut short by a crash so the next entry stays readable
+            self._file.write("\n")
+        self.write({'event': 'resume' if resume else 'start', 'time': datetime.now().isoformat(timespec='seconds')})
+        self.sync()
+
+    def record(self, idx, success):
+        self.write({'idx': int(idx), 'status': 'ok' if success else 'failed'})
+
+    def write(self, entry):
+        with self._lock:
+            self._file.write(json.dumps(entry) + "\n")
+            self._pending += 1
+            if self._pending >= self.sync_every or time.monotonic() - self._last_sync >= self.sync_interval:
+                self._sync()
+
+    def sync(self):
+        with self._lock:
+            self._sync()
+
+    def _sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._pending = 0
+        self._last_sync = time.monotonic()
+
+    def close(self):
+        with self._lock:
+            if self._file:
+                self._sync()
+                self._file.close()
+                self._file = None
+
+
+class SubmittedIndex:
+    # Content hashes of rows already submitted to a site, shared by all runs and
+    # data files. Only hashes are stored, never the row values. Inserts are
+    # committed in batches like the checkpoint journal.
+    def __init__(self, path=SUBMITTED_INDEX_PATH, commit_every=50, commit_interval=2.0):
+        self.path = path
+        self.commit_every = commit_every
+        self.commit_interval = commit_interval
+        self._conn = None
+        self._pending = 0
+        self._last_commit = time.monotonic()
+        self._lock = Lock()
+
+    def open(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS submitted (site TEXT NOT NULL, hash BLOB NOT NULL, "
+                           "source TEXT, submitted_at REAL NOT NULL, PRIMARY KEY (site, hash)) WITHOUT ROWID")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS submitted_at ON submitted (submitted_at)")
+        self._conn.commit()
+        return self
+
+    @staticmethod
+    def row_hash(row):
+        # Values are already normalized by the pre-flight checks; the row's position in a file does not matter
+        text = "\x1f".join('' if value is None else str(value).strip() for value in row)
+        return hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
+
+    def submitted(self, site, hashes):
+        # The subset of hashes already recorded for site
+        found = set()
+        with self._lock:
+            for start in range(0, len(hashes), 500):
+                batch = hashes[start:start + 500]
+                placeholders = ','.join('?' * len(batch))
+                found.update(row[0] for row in self._conn.execute(
+                    f"SELECT hash FROM submitted WHERE site = ? AND hash IN ({placeholders})", [site, *batch]))
+        return found
+
+    def add(self, site, row, source):
+        with self._lock:
+            self._conn.execute("INSERT OR IGNORE INTO submitted VALUES (?, ?, ?, ?)",
+                               (site, self.row_hash(row), source, time.time()))
+            self._pending += 1
+            if self._pending >= self.commit_every or time.monotonic() - self._last_commit >= self.commit_interval:
+                self._commit()
+
+    def _commit(self):
+        self._conn.commit()
+        self._pending = 0
+        self._last_commit = time.monotonic()
+
+    def stats(self):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT site, COUNT(*), MIN(submitted_at), MAX(submitted_at) FROM submitted "
+                "GROUP BY site ORDER BY site").fetchall()
+
+    def prune(self, site=None, before=None):
+        # Deletes the hashes of one site and/or those recorded before a timestamp
+        clauses, params = [], []
+        if site is not None:
+            clauses.append("site = ?")
+            params.append(site)
+        if before is not None:
+            clauses.append("submitted_at < ?")
+            params.append(before)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            deleted = self._conn.execute(f"DELETE FROM submitted{where}", params).rowcount
+            self._commit()
+        return deleted
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._commit()
+                self._conn.close()
+                self._conn = None
+
+
+class JobQueue:
+    # Rows of a data file in a SQLite table that any number of worker processes
+    # claim in leased batches. A lease that is not renewed in time (the worker
+    # died or hung) expires and its rows are handed out again; rows claimed
+    # max_claims times without finishing are marked failed.
+    STATUSES = ('pending', 'leased', 'done', 'failed')
+
+    def __init__(self, path, lease_seconds=300, max_claims=3, wal=True):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_claims = max_claims
+        self.wal = wal
+        self._conn = None
+        self._lock = Lock()
+
+    def open(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        # Autocommit mode; claims use explicit BEGIN IMMEDIATE transactions
+        self._conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        if self.wal:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS jobs (idx INTEGER PRIMARY KEY, row_values TEXT NOT NULL, "
+                           "status TEXT NOT NULL DEFAULT 'pending', lease_owner TEXT, lease_expires REAL, "
+                           "attempts INTEGER NOT NULL DEFAULT 0, updated REAL)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, idx)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        return self
+
+    def meta(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def load(self, source, columns, rows):
+        # Adds (idx, values) rows; loading the same file again only adds rows that are new.
+        # Each batch is its own transaction, so workers can claim while a big file loads.
+        with self._transaction():
+            known = self._conn.execute("SELECT value FROM meta WHERE key = 'source'").fetchone()
+            if known and json.loads(known[0]) != source:
+                raise FormFillerError(f"{self.path} already holds entries of {json.loads(known[0])}")
+            self._conn.executemany("INSERT OR REPLACE INTO meta VALUES (?, ?)",
+                                   [('source', json.dumps(source)), ('columns', json.dumps(columns))])
+        added = 0
+        for batch in iter(lambda: list(itertools.islice(rows, 1000)), []):
+            with self._transaction():
+                added += self._conn.executemany(
+                    "INSERT OR IGNORE INTO jobs (idx, row_values, updated) VALUES (?, ?, ?)",
+                    [(idx, json.dumps(values), time.time()) for idx, values in batch]).rowcount
+        return added
+
+    @contextmanager
+    def _transaction(self):
+        # BEGIN IMMEDIATE takes the write lock up front, so two workers never claim the same rows
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def claim(self, owner, count):
+        # Atomically leases up to count rows: pending ones first, then expired leases
+        now = time.time()
+        with self._transaction():
+            self._conn.execute("UPDATE jobs SET status = 'failed', lease_owner = NULL, lease_expires = NULL, "
+                               "updated = ? WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?",
+                               (now, now, self.max_claims))
+            claimed = self._conn.execute(
+                "SELECT idx, row_values FROM jobs WHERE status = 'pending' "
+                "OR (status = 'leased' AND lease_expires < ?) ORDER BY idx LIMIT ?", (now, count)).fetchall()
+            self._conn.executemany(
+                "UPDATE jobs SET status = 'leased', lease_owner = ?, lease_expires = ?, "
+                "attempts = attempts + 1, updated = ? WHERE idx = ?",
+                [(owner, now + self.lease_seconds, now, idx) for idx, _ in claimed])
+        return [(idx, tuple(json.loads(values))) for idx, values in claimed]
+
+    def renew(self, owner):
+        # Returns how many rows owner still holds; fewer than it claimed means leases were lost
+        with self._lock:
+            return self._conn.execute("UPDATE jobs SET lease_expires = ? WHERE status = 'leased' AND lease_owner = ?",
+                                      (time.time() + self.lease_seconds, owner)).rowcount
+
+    def held(self, owner, idxs):
+        # The given rows that are still leased to owner
+        idxs = list(idxs)
+        if not idxs:
+            return set()
+        placeholders = ','.join('?' * len(idxs))
+        with self._lock:
+            return {idx for (idx,) in self._conn.execute(
+                f"SELECT idx FROM jobs WHERE status = 'leased' AND lease_owner = ? AND idx IN ({placeholders})",
+                (owner, *idxs))}
+
+    def complete(self, idx, success, owner):
+        # False if the row is no longer leased to owner, e.g. another worker took over its expired lease
+        with self._lock:
+            return self._conn.execute(
+                "UPDATE jobs SET status = ?, lease_owner = NULL, lease_expires = NULL, updated = ? "
+                "WHERE idx = ? AND status = 'leased' AND lease_owner = ?",
+                ('done' if success else 'failed', time.time(), idx, owner)).rowcount > 0
+
+    def release(self, owner):
+        # Hands rows this worker claimed but did not finish back to the others
+        with self._lock:
+            return self._conn.execute(
+                "UPDATE jobs SET status = 'pending', lease_owner = NULL, lease_expires = NULL, "
+                "attempts = attempts - 1, updated = ? WHERE status = 'leased' AND lease_owner = ?",
+                (time.time(), owner)).rowcount
+
+    def requeue(self, statuses=('failed',)):
+        placeholders = ','.join('?' * len(statuses))
+        with self._lock:
+            return self._conn.execute(
+                f"UPDATE jobs SET status = 'pending', lease_owner = NULL, lease_expires = NULL, attempts = 0, "
+                f"updated = ? WHERE status IN ({placeholders})", (time.time(), *statuses)).rowcount
+
+    def remaining(self):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = 'pending' OR (status = 'leased' AND lease_expires < ?)",
+                (time.time(),)).fetchone()[0]
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+            owners = self._conn.execute(
+                "SELECT lease_owner, COUNT(*), MAX(lease_expires) FROM jobs WHERE status = 'leased' "
+                "GROUP BY lease_owner ORDER BY lease_owner").fetchall()
+        return {status: counts.get(status, 0) for status in self.STATUSES}, owners
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class SessionCache:
+    # Playwright storage_state of successful logins, one file per site URL.
+    # The files hold session cookies, so they are only readable by the owner.
+    def __init__(self, directory=SESSION_CACHE_DIR, ttl=12 * 3600):
+        self.directory = directory
+        self.ttl = ttl
+
+    def path_for(self, url):
+        return os.path.join(self.directory, hashlib.sha256(url.encode('utf-8')).hexdigest()[:24] + ".json")
+
+    def load(self, url):
+        path = self.path_for(url)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get('url') != url or time.time() - entry.get('saved_at', 0) > self.ttl:
+            self.invalidate(url)
+            return None
+        return entry.get('storage_state')
+
+    def save(self, url, storage_state):
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        path = self.path_for(url)
+        tmp_path = f"{path}.tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump({'url': url, 'saved_at': time.time(), 'storage_state': storage_state}, f)
+        os.replace(tmp_path, path)
+
+    def invalidate(self, url):
+        try:
+            os.remove(self.path_for(url))
+        except OSError:
+            pass
+
+
+class PacingController:
+    # Decides how long the engine waits between fields, rows and retries.
+    # Fixed mode reproduces the configured sleeps. Adaptive mode relies on
+    # readiness waits instead and sizes the inter-row delay AIMD-style:
+    # errors and latency spikes double it, every clean row shrinks it by a step.
+    def __init__(self, adaptive=False, field_delay=0.5, row_delay=2, target_rpm=0, step=0.1, max_delay=30.0):
+        self.adaptive = adaptive
+        self.field_delay = field_delay
+        self.row_delay = row_delay
+        self.min_interval = 60.0 / target_rpm if target_rpm > 0 else 0.0
+        self.step = step
+        self.max_delay = max_delay
+        self.delay = 0.0
+        self.latency_avg = None
+        self.samples = 0
+        self.next_start = 0.0
+        self._lock = Lock()
+
+    def field_wait(self):
+        return 0.0 if self.adaptive else self.field_delay
+
+    def row_start_wait(self):
+        # Reserves the next start under the rows-per-minute ceiling, shared by all workers
+        if not self.min_interval:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self.next_start)
+            self.next_start = start + self.min_interval
+            return start - now
+
+    def row_succeeded(self, latency):
+        if not self.adaptive:
+            return self.row_delay
+        with self._lock:
+            spike = self.samples >= 5 and latency > 3 * self.latency_avg
+            if self.latency_avg is None:
+                self.latency_avg = latency
+            else:
+                self.latency_avg = 0.8 * self.latency_avg + 0.2 * latency
+            self.samples += 1
+            if spike:
+                self._back_off()
+            else:
+                self.delay = max(0.0, self.delay - self.step)
+            return self.delay
+
+    def attempt_failed(self, final):
+        # Retries are spaced by the retry queue's backoff; this only paces the next row
+        if not self.adaptive:
+            return self.row_delay if final else 0.0
+        with self._lock:
+            self._back_off()
+            return self.delay
+
+    def _back_off(self):
+        self.delay = min(self.max_delay, max(self.delay * 2, 0.25))
+
+
+class FieldPlan:
+    # One mapped column; the element kind and select options are learned on
+    # the first block and reused for every later one.
+    def __init__(self, column, offset, field_type='text', select_by='auto'):
+        self.column = column
+        self.offset = offset
+        self.field_type = field_type
+        self.select_by = select_by
+        self.tag_name = None
+        self.options = None
+
+    def selector(self, element_id):
+        if self.tag_name:
+            return f"{self.tag_name}#{element_id}"
+        return f"input#{element_id}, select#{element_id}, textarea#{element_id}"
+
+    def learn_options(self, options):
+        # Maps a cell value to the option value to select; values win over labels
+        lookup = {}
+        if self.select_by in ('label', 'auto'):
+            lookup.update((label, value) for value, label in options)
+        if self.select_by in ('value', 'auto'):
+            lookup.update((value, value) for value, label in options)
+        self.options = lookup
+
+
+class FillPlan:
+    # Compiled form mapping: which column goes into which element of a block
+    def __init__(self, fields, stride=6, id_prefix='element_'):
+        self.fields = sorted(fields, key=lambda f: f.column)
+        self.stride = stride
+        self.id_prefix = id_prefix
+        self.first_offset = min(f.offset for f in self.fields)
+        self.last_offset = max(f.offset for f in self.fields)
+
+    @classmethod
+    def compile(cls, mapping, columns):
+        # columns are the data file's column names; mapping columns may be names or positions
+        fields = []
+        for entry in mapping.get('fields', []):
+            column = entry['column']
+            if not isinstance(column, int):
+                if column not in columns:
+                    raise FormFillerError(f"Mapped column '{column}' is not in the data file ({', '.join(columns)})")
+                column = columns.index(column)
+            elif not 0 <= column < len(columns):
+                raise FormFillerError(f"Mapped column {column} is out of range for {len(columns)} data columns")
+            field_type = entry.get('type', 'text')
+            select_by = entry.get('select_by', 'auto')
+            if field_type not in ('text', 'select') or select_by not in SELECT_STRATEGIES:
+                raise FormFillerError(f"Invalid mapping entry: {entry}")
+            fields.append(FieldPlan(column, int(entry['offset']), field_type, select_by))
+        if not fields:
+            raise FormFillerError("The form mapping has no fields")
+        return cls(fields, int(mapping.get('stride', 6)), mapping.get('id_prefix', 'element_'))
+
+    @classmethod
+    def load(cls, path, columns):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                mapping = json.load(f)
+        except (OSError, ValueError) as e:
+            raise FormFillerError(f"Could not read form mapping {path}: {e}") from e
+        return cls.compile(mapping, columns)
+
+    def block(self, row_data, idx):
+        # (field plan, element id, value) for every non-empty mapped cell of a row
+        base_index = idx * self.stride
+        for field_plan in self.fields:
+            value = row_data[field_plan.column]
+            if value is not None:
+                yield field_plan, f"{self.id_prefix}{base_index + field_plan.offset}", str(value).strip()
+
+    def block_range(self, idx):
+        base_index = idx * self.stride
+        return f"elements {base_index + self.first_offset}-{base_index + self.last_offset}"
+
+    def block_ids(self, idx):
+        base_index = idx * self.stride
+        return [f"{self.id_prefix}{base_index + field_plan.offset}" for field_plan in self.fields]
+
+    def last_element_id(self, idx):
+        return f"{self.id_prefix}{idx * self.stride + self.last_offset}"
+
+
+class ResourceBlocker:
+    # context.route handler that aborts requests by resource type or URL pattern.
+    # Hosts on the allowlist (and their subdomains) are never blocked.
+    def __init__(self, resource_types=(), url_patterns=(), allow_hosts=()):
+        self.resource_types = frozenset(resource_types)
+        self.url_patterns = list(url_patterns)
+        self.allow_hosts = tuple(host.lower() for host in allow_hosts)
+        self._lock = Lock()
+        self.allowed = 0
+        self.allowed_bytes = 0
+        self.blocked = {}
+
+    @classmethod
+    def from_profile(cls, profile):
+        # profile is a BLOCK_PROFILES name or the path of a JSON file
+        if profile in BLOCK_PROFILES:
+            settings = BLOCK_PROFILES[profile]
+        else:
+            try:
+                with open(profile, 'r', encoding='utf-8') as f:
+                    settings = json.load(f)
+            except (OSError, ValueError) as e:
+                raise FormFillerError(f"Could not read block profile {profile}: {e}") from e
+        if not settings:
+            return None
+        return cls(settings.get('resource_types', ()), settings.get('url_patterns', ()),
+                   settings.get('allow_hosts', ()))
+
+    def is_allowed_host(self, url):
+        host = (urlsplit(url).hostname or '').lower()
+        return any(host == allowed or host.endswith('.' + allowed) for allowed in self.allow_hosts)
+
+    def block_reason(self, request):
+        if self.is_allowed_host(request.url):
+            return None
+        if request.resource_type in self.resource_types:
+            return request.resource_type
+        if any(fnmatch.fnmatchcase(request.url, pattern) for pattern in self.url_patterns):
+            return 'pattern'
+        return None
+
+    def count(self, reason):
+        with self._lock:
+            if reason is None:
+                self.allowed += 1
+            else:
+                self.blocked[reason] = self.blocked.get(reason, 0) + 1
+
+    def handle(self, route):
+        reason = self.block_reason(route.request)
+        self.count(reason)
+        if reason is None:
+            route.continue_()
+        else:
+            route.abort('blockedbyclient')
+
+    async def handle_async(self, route):
+        reason = self.block_reason(route.request)
+        self.count(reason)
+        if reason is None:
+            await route.continue_()
+        else:
+            await route.abort('blockedbyclient')
+
+    def record_response(self, response):
+        # Aborted requests never report a size, so only what was let through is measured
+        length = response.headers.get('content-length')
+        if length and length.isdigit():
+            with self._lock:
+                self.allowed_bytes += int(length)
+
+    def attach(self, context):
+        context.route("**/*", self.handle)
+        context.on("response", self.record_response)
+
+    async def attach_async(self, context):
+        await context.route("**/*", self.handle_async)
+        context.on("response", self.record_response)
+
+    def report(self):
+        blocked_total = sum(self.blocked.values())
+        by_reason = ', '.join(f"{reason}: {hits}" for reason, hits in sorted(self.blocked.items()))
+        return (f"Blocked {blocked_total} requests ({by_reason or 'none'}); "
+                f"allowed {self.allowed} requests, {self.allowed_bytes / 1024:.0f} KB received")
+
+
+def format_duration(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}"
+
+
+class Metrics:
+    # Per-stage timing histograms, counters and a sliding rows/min window.
+    # Shared by all worker threads and the asyncio loop.
+    def __init__(self, rate_window=60.0):
+        self._lock = Lock()
+        self.histograms = {}
+        self.counters = {}
+        self.started = time.monotonic()
+        self.rate_window = rate_window
+        self.completions = deque()
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = {'buckets': [0] * (len(METRIC_BUCKETS) + 1), 'sum': 0.0, 'count': 0}
+            histogram['buckets'][bisect.bisect_left(METRIC_BUCKETS, seconds)] += 1
+            histogram['sum'] += seconds
+            histogram['count'] += 1
+
+    @contextmanager
+    def span(self, stage):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started)
+
+    def inc(self, counter, amount=1):
+        with self._lock:
+            self.counters[counter] = self.counters.get(counter, 0) + amount
+
+    def row_completed(self):
+        with self._lock:
+            self.completions.append(time.monotonic())
+
+    def rows_per_minute(self):
+        now = time.monotonic()
+        with self._lock:
+            while self.completions and self.completions[0] < now - self.rate_window:
+                self.completions.popleft()
+            recent = len(self.completions)
+        # At least a few seconds, so the first rows do not report an absurd rate
+        window = max(5.0, min(self.rate_window, now - self.started))
+        return recent * 60 / window
+
+    def readout(self, completed, total):
+        rate = self.rows_per_minute()
+        remaining = total - completed
+        if remaining <= 0:
+            eta = "done"
+        elif rate > 0:
+            eta = format_duration(remaining / rate * 60)
+        else:
+            eta = "unknown"
+        return f"{completed}/{total} entries, {rate:.1f} rows/min, ETA {eta}"
+
+    @staticmethod
+    def quantile(histogram, q):
+        # Upper bound of the bucket holding the q-th observation; None past the last bucket
+        target = q * histogram['count']
+        seen = 0
+        for bound, count in zip(METRIC_BUCKETS, histogram['buckets']):
+            seen += count
+            if seen >= target:
+                return bound
+        return None
+
+    def snapshot(self, completed, total):
+        with self._lock:
+            counters = dict(self.counters)
+            histograms = {stage: {'buckets': list(h['buckets']), 'sum': h['sum'], 'count': h['count']}
+                          for stage, h in self.histograms.items()}
+        rate = self.rows_per_minute()
+        return {
+            'time': datetime.now().isoformat(timespec='seconds'),
+            'elapsed': round(time.monotonic() - self.started, 3),
+            'completed': completed,
+            'total': total,
+            'rows_per_minute': round(rate, 2),
+            'eta_seconds': round((total - completed) / rate * 60) if rate > 0 else None,
+            'counters': counters,
+            'histograms': histograms,
+        }
+
+    def write_prometheus(self, path, snapshot):
+        lines = [
+            "# HELP form_filler_stage_seconds Time spent per stage.",
+            "# TYPE form_filler_stage_seconds histogram",
+        ]
+        for stage, histogram in sorted(snapshot['histograms'].items()):
+            cumulative = 0
+            for bound, count in zip(METRIC_BUCKETS + ('+Inf',), histogram['buckets']):
+                cumulative += count
+                lines.append(f'form_filler_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+            lines.append(f'form_filler_stage_seconds_sum{{stage="{stage}"}} {histogram["sum"]:.6f}')
+            lines.append(f'form_filler_stage_seconds_count{{stage="{stage}"}} {histogram["count"]}')
+        for name, value in sorted(snapshot['counters'].items()):
+            lines.append(f"# TYPE form_filler_{name}_total counter")
+            lines.append(f"form_filler_{name}_total {value}")
+        lines.append("# TYPE form_filler_rows_completed gauge")
+        lines.append(f"form_filler_rows_completed {snapshot['completed']}")
+        lines.append("# TYPE form_filler_rows_total_planned gauge")
+        lines.append(f"form_filler_rows_total_planned {snapshot['total']}")
+        lines.append("# TYPE form_filler_rows_per_minute gauge")
+        lines.append(f"form_filler_rows_per_minute {snapshot['rows_per_minute']}")
+        # Written to a temporary file and renamed so scrapers never see half a file
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'w') as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(temp_path, path)
+
+    def append_jsonl(self, path, snapshot):
+        stages = {stage: {'count': h['count'], 'sum': round(h['sum'], 6),
+                          'p50': self.quantile(h, 0.5), 'p95': self.quantile(h, 0.95)}
+                  for stage, h in snapshot['histograms'].items()}
+        record = {key: value for key, value in snapshot.items() if key != 'histograms'}
+        record['stages'] = stages
+        with open(path, 'a') as f:
+            f.write(json.dumps(record) + "\n")
+
+
+class RowValidator:
+    # Vectorized clean-up and checks over a whole chunk, so bad values are found
+    # before their rows reach the browser. Only the default column names are checked.
+    def __init__(self, id_pattern=ID_PATTERN, max_age=MAX_AGE):
+        self.id_pattern = id_pattern
+        self.max_age = max_age
+
+    def check(self, chunk):
+        # Returns the normalized chunk and a Series of problems for its invalid rows
+        chunk = chunk.apply(lambda column: column.str.strip())
+        chunk = chunk.mask(chunk == '')
+        problems = []
+        if 'gender' in chunk:
+            given = chunk['gender']
+            mapped = given.str.lower().map(GENDER_VALUES)
+            bad = given.notna() & mapped.isna()
+            problems.append(("gender '" + given + "'").where(bad))
+            chunk['gender'] = mapped.where(~bad, given)
+        if 'age' in chunk:
+            given = chunk['age']
+            numbers = pd.to_numeric(given, errors='coerce')
+            good = numbers.notna() & (numbers % 1 == 0) & numbers.between(0, self.max_age)
+            problems.append(("age '" + given + "'").where(given.notna() & ~good))
+            chunk.loc[good, 'age'] = numbers[good].astype('int64').astype(str)
+        if 'id' in chunk and self.id_pattern:
+            given = chunk['id']
+            bad = given.notna() & ~given.str.fullmatch(self.id_pattern, na=False)
+            problems.append(("id '" + given + "'").where(bad))
+        if not problems:
+            return chunk, pd.Series(dtype=object)
+        problems = pd.concat(problems, axis=1)
+        invalid = problems[problems.notna().any(axis=1)]
+        return chunk, invalid.apply(lambda row: '; '.join(row.dropna()), axis=1)
+
+
+def retry_backoff(attempts, base_delay, max_delay=60.0):
+    # Exponential backoff with jitter, so rows that failed together do not retry together
+    delay = min(max_delay, base_delay * 2 ** (attempts - 1))
+    return random.uniform(delay / 2, delay)
+
+
+class RetryJob:
+    # A row with its form block; retries must go back into the block they started in
+    def __init__(self, idx, row, slot):
+        self.idx = idx
+        self.row = row
+        self.slot = slot
+        self.attempts = 0
+        self.started = time.perf_counter()
+
+
+def parse_form_body(content_type, body):
+    # [name, value] pairs of a recorded form post, in order
+    if content_type.startswith('application/x-www-form-urlencoded'):
+        return [list(pair) for pair in parse_qsl(body.decode('utf-8'), keep_blank_values=True)]
+    if content_type.startswith('multipart/form-data'):
+        message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+            b"Content-Type: " + content_type.encode('latin-1') + b"\r\n\r\n" + body)
+        fields = []
+        for part in message.iter_parts():
+            if part.get_filename():
+                raise FormFillerError("Replaying forms with file uploads is not supported")
+            fields.append([part.get_param('name', header='content-disposition'),
+                           part.get_payload(decode=True).decode('utf-8')])
+        return fields
+    raise FormFillerError(f"Cannot replay a form posted as {content_type or 'unknown content type'}")
+
+
+def encode_form_body(content_type, fields):
+    if content_type.startswith('application/x-www-form-urlencoded'):
+        return urlencode(fields).encode('utf-8')
+    header = email.message.Message()
+    header['Content-Type'] = content_type
+    boundary = header.get_param('boundary')
+    parts = [f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n'.encode('utf-8')
+             + value.encode('utf-8') + b"\r\n" for name, value in fields]
+    return b"".join(parts) + f"--{boundary}--\r\n".encode('utf-8')
+
+
+def cookie_header(cookies):
+    return "; ".join(f"{cookie['name']}={cookie['value']}" for cookie in cookies)
+
+
+class ReplayAuthError(FormFillerError):
+    # The site rejected a replayed post as logged out or with stale tokens
+    pass
+
+
+class SubmitTemplate:
+    # The form's submit request, recorded once in the browser. Entries are
+    # replayed by writing their values into the recorded block fields; hidden
+    # tokens and every other field are sent as recorded.
+    def __init__(self, url, headers, content_type, fields, block_names):
+        self.url = url
+        self.headers = {name: value for name, value in headers.items()
+                        if name.lower() not in REPLAY_DROP_HEADERS and not name.startswith(':')}
+        self.content_type = content_type
+        self.fields = fields
+        self.block_names = block_names  # Per block, the field names in FillPlan.fields order
+        self.cookie = ""
+
+    @classmethod
+    def from_request(cls, request, block_names):
+        headers = request.all_headers()
+        content_type = headers.get('content-type', '')
+        fields = parse_form_body(content_type, request.post_data_buffer or b"")
+        posted = {name for name, value in fields}
+        # Only blocks the form actually posted can be used
+        usable = []
+        for names in block_names:
+            if any(name is None or name not in posted for name in names):
+                break
+            usable.append(names)
+        if not usable:
+            raise FormFillerError("The recorded submit request does not contain the mapped form fields")
+        return cls(request.url, headers, content_type, fields, usable)
+
+    def update_tokens(self, hidden_fields, cookie):
+        tokens = dict(hidden_fields)
+        block_fields = {name for names in self.block_names for name in names}
+        for field in self.fields:
+            if field[0] in tokens and field[0] not in block_fields:
+                field[1] = tokens[field[0]]
+        self.cookie = cookie
+
+    def block_values(self, plan, row):
+        # The row's values as the form posts them, in FillPlan.fields order
+        values = []
+        for field_plan in plan.fields:
+            value = row[field_plan.column]
+            value = '' if value is None else str(value).strip()
+            if value and field_plan.field_type == 'select' and field_plan.options is not None:
+                option_value = field_plan.options.get(value)
+                if option_value is None:
+                    raise FillFailure(FAILURE_SELECT_MISMATCH, f"No matching option for column {field_plan.column + 1}: {value}")
+                value = option_value
+            values.append(value)
+        return values
+
+    def body(self, blocks):
+        # Blocks past the given ones are posted empty
+        values = {name: '' for names in self.block_names for name in names}
+        for names, block in zip(self.block_names, blocks):
+            values.update(zip(names, block))
+        return encode_form_body(self.content_type, [(name, values.get(name, value)) for name, value in self.fields])
+
+    def request_headers(self):
+        headers = dict(self.headers)
+        if self.cookie:
+            headers['Cookie'] = self.cookie
+        return headers
+
+
+class ReplayClient:
+    # Keep-alive connections to the form host, one per sender thread and reused for every post
+    def __init__(self, url, timeout=30):
+        parts = urlsplit(url)
+        self.https = parts.scheme == 'https'
+        self.host = parts.hostname
+        self.port = parts.port
+        self.path = (parts.path or '/') + (f"?{parts.query}" if parts.query else "")
+        self.timeout = timeout
+        self._local = local()
+        self._connections = []
+        self._lock = Lock()
+
+    def connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            connection_class = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+            conn = connection_class(self.host, self.port, timeout=self.timeout)
+            self._local.conn = conn
+            self._local.used = False
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def post(self, body, headers):
+        # Returns (status, headers, body)
+        while True:
+            conn = self.connection()
+            reused = self._local.used
+            try:
+                conn.request('POST', self.path, body=body, headers=headers)
+                response = conn.getresponse()
+                data = response.read()
+                self._local.used = True
+                return response.status, dict(response.getheaders()), data
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                conn.close()
+                self._local.conn = None
+                # The server closed an idle kept-alive connection; a fresh one gets one try
+                if not reused:
+                    raise
+
+    def close(self):
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections = []
+
+
+class FormWindow:
+    # Blocks used in the current copy of the form. With a size, filled rows are
+    # held back and only recorded once their window has been submitted.
+    def __init__(self, size=0):
+        self.size = size
+        self.slots = 0
+        self.filled = []
+
+    def next_slot(self):
+        slot = self.slots
+        self.slots += 1
+        return slot
+
+    def full(self):
+        return bool(self.size) and self.slots >= self.size
+
+    def pending(self):
+        return bool(self.size) and self.slots > 0
+
+    def reset(self):
+        self.slots = 0
+        self.filled = []
+
+
+class RetryQueue:
+    # Rows waiting for another attempt, ordered by when they are due. One per form frame.
+    def __init__(self):
+        self._heap = []
+        self._order = itertools.count()
+
+    def __len__(self):
+        return len(self._heap)
+
+    def push(self, job, delay):
+        heapq.heappush(self._heap, (time.monotonic() + delay, next(self._order), job))
+
+    def pop_due(self):
+        if self._heap and self._heap[0][0] <= time.monotonic():
+            return heapq.heappop(self._heap)[2]
+        return None
+
+    def wait_time(self):
+        return max(0.0, self._heap[0][0] - time.monotonic()) if self._heap else 0.0
+
+
+class TraceRing:
+    # Playwright trace of one context, cut into a chunk per fill attempt. Chunks
+    # of successful attempts are dropped without being written; failed ones
+    # wait in a temp directory, only the last `keep` of them, and are copied to
+    # out_dir once their entry is given up on.
+    def __init__(self, tracing, out_dir, keep=5, log=None):
+        self.tracing = tracing
+        self.out_dir = out_dir
+        self.keep = max(1, int(keep))
+        self.log = log or (lambda message, level=logging.INFO: None)
+        self.temp_dir = None
+        self.chunks = deque()  # (idx, path)
+        self.active = False
+
+    def start(self):
+        try:
+            self.tracing.start(screenshots=True, snapshots=True)
+        except Exception as e:
+            self.log(f"Could not start tracing: {str(e)}", level=logging.WARNING)
+            return self
+        self.temp_dir = tempfile.mkdtemp(prefix="form_filler_trace_")
+        self.active = True
+        return self
+
+    def begin(self, job):
+        if self.active:
+            self._call(self.tracing.start_chunk, title=f"Entry {job.idx + 1}, attempt {job.attempts + 1}")
+
+    def end(self, job, failed):
+        if not self.active:
+            return
+        if not failed:
+            self._call(self.tracing.stop_chunk)
+            return
+        path = os.path.join(self.temp_dir, f"entry_{job.idx + 1}_attempt_{job.attempts}.zip")
+        if self._call(self.tracing.stop_chunk, path=path):
+            self.chunks.append((job.idx, path))
+            while len(self.chunks) > self.keep:
+                _, old_path = self.chunks.popleft()
+                os.remove(old_path)
+
+    def save(self, job):
+        # Copies the entry's attempts still in the ring; returns the saved paths
+        saved = []
+        if not self.active:
+            return saved
+        os.makedirs(self.out_dir, exist_ok=True)
+        for idx, path in self.chunks:
+            if idx == job.idx:
+                target = os.path.join(self.out_dir, os.path.basename(path))
+                shutil.copyfile(path, target)
+                saved.append(target)
+        return saved
+
+    def _call(self, method, **kwargs):
+        try:
+            method(**kwargs)
+            return True
+        except Exception as e:
+            # Tracing is diagnostics only; a broken trace must not fail the entry
+            self.log(f"Tracing stopped: {str(e)}", level=logging.WARNING)
+            self.active = False
+            return False
+
+    def close(self):
+        if self.active:
+            self._call(self.tracing.stop)
+        self.active = False
+        if self.temp_dir:
+            shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+
+class DeadLetterLog:
+    # CSV of rows that were given up on, with the failure kind and last error
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+        self._file = None
+        self._writer = None
+        self._lock = Lock()
+
+    def write(self, job, kind, error, columns):
+        with self._lock:
+            if self._file is None:
+                new_file = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+                self._file = open(self.path, 'a', newline='', encoding='utf-8')
+                self._writer = csv.writer(self._file)
+                if new_file:
+                    self._writer.writerow(['entry', 'failure', 'attempts', 'error'] + list(columns))
+            values = ['' if value is None else value for value in job.row]
+            self._writer.writerow([job.idx + 1, kind, job.attempts, str(error)] + values)
+            self._file.flush()
+            self.count += 1
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class RowFeed:
+    # Thread-safe iterator over (idx, values) rows shared by all workers
+    def __init__(self, rows):
+        self._rows = iter(rows)
+        self._lock = Lock()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        with self._lock:
+            return next(self._rows)
+
+
+def find_free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class FormFillerEngine:
+    # Runs the load -> login -> fill loop without any GUI. Front-ends plug in
+    # through the optional callbacks; every callback may be omitted.
+    def __init__(self, file_path, website_url, password="", delay_time=0.5, between_forms_delay=2,
+                 max_retries=3, max_entries_to_process=0, headless=False, workers=1, batch_fill=False,
+                 chunk_size=10000, resume=False, requeue_failed=False,
+                 session_cache=True, session_ttl=12 * 3600, adaptive_pacing=False, target_rpm=0,
+                 log_level='entry', mapping_file=None, block_profile='off',
+                 metrics_prom=None, metrics_jsonl=None, metrics_interval=10,
+                 retry_backoff=2.0, dead_letter_file=None, preflight='quarantine', id_pattern=ID_PATTERN,
+                 dedupe=False, dedupe_index=SUBMITTED_INDEX_PATH, window_size=0, file_type=None,
+                 browser_endpoint=None, job_queue=None, queue_batch=50, lease_seconds=300, queue_wal=True,
+                 replay=False, replay_concurrency=4, replay_success=None, trace_dir=None, trace_keep=5,
+                 lookahead=0,
+                 log_callback=None, status_callback=None, progress_callback=None,
+                 prompt_callback=None, finish_callback=None, error_callback=None,
+                 stop_event=None, pause_event=None):
+        self.file_path = file_path
+        self.file_type = file_type or file_type_for(file_path)
+        self.website_url = website_url
+        self.password = password
+        self.delay_time = delay_time
+        self.between_forms_delay = between_forms_delay
+        self.max_retries = max_retries
+        self.max_entries_to_process = max_entries_to_process  # 0 means process all
+        self.headless = headless
+        self.browser_endpoint = browser_endpoint  # CDP URL of a running `browser-server`
+        self.workers = max(1, int(workers))
+        self.batch_fill = batch_fill
+        self.chunk_size = max(1, int(chunk_size))
+        self.columns = list(DEFAULT_HEADERS)
+        self.resume = resume
+        self.requeue_failed = requeue_failed
+        self.journal = CheckpointJournal(f"{file_path}.journal")
+        self.session_cache = SessionCache(ttl=session_ttl) if session_cache else None
+        self.pacer = PacingController(adaptive_pacing, delay_time, between_forms_delay, target_rpm)
+        self.log_level = LOG_LEVELS[log_level]
+        self.mapping_file = mapping_file
+        self.plan = None
+        self.block_profile = block_profile
+        self.blocker = None
+        self.metrics = Metrics()
+        self.retry_backoff = retry_backoff
+        self.dead_letter = DeadLetterLog(dead_letter_file or f"{file_path}.failed.csv")
+        self.preflight = preflight
+        self.validator = RowValidator(id_pattern) if preflight != 'off' else None
+        self.invalid_file = f"{file_path}.invalid.csv"
+        self.invalid_count = 0
+        self.reported_invalid = set()
+        self.submitted_index = SubmittedIndex(dedupe_index) if dedupe else None
+        self.duplicate_count = 0
+        self.window_size = max(0, int(window_size))
+        self.job_queue = JobQueue(job_queue, lease_seconds, wal=queue_wal) if job_queue else None
+        self.replay = replay
+        self.replay_concurrency = max(1, int(replay_concurrency))
+        self.replay_success = replay_success
+        self.trace_dir = trace_dir
+        self.trace_keep = trace_keep
+        self.lookahead = max(0, int(lookahead))
+        self.queue_batch = max(1, int(queue_batch))
+        self.queue_owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._last_renew = time.monotonic()
+        self._claimed = set()  # Queue rows leased to this worker and not finished yet
+        self.metrics_prom = metrics_prom
+        self.metrics_jsonl = metrics_jsonl
+        self.metrics_interval = metrics_interval
+        self.total_entries = 0
+        self._export_lock = Lock()
+        self._last_export = time.monotonic()
+
+        self.log_callback = log_callback
+        self.status_callback = status_callback
+        self.progress_callback = progress_callback
+        self.prompt_callback = prompt_callback
+        self.finish_callback = finish_callback
+        self.error_callback = error_callback
+
+        self.stop_event = stop_event or Event()
+        if pause_event is None:
+            pause_event = Event()
+            pause_event.set()  # Not paused initially
+        self.pause_event = pause_event
+
+        # Shared between worker threads
+        self._lock = Lock()
+        self.success_count = 0
+        self.failure_count = 0
+        self.completed_count = 0
+
+    def log(self, message, level=logging.INFO):
+        if level < self.log_level:
+            return
+        prefix = log_prefix.get()
+        if prefix:
+            message = f"{prefix} {message}"
+        logger.log(level, message)
+        if self.log_callback:
+            self.log_callback(message)
+
+    def update_status(self, message):
+        if self.status_callback:
+            self.status_callback(message)
+
+    def update_progress(self, value, maximum):
+        if self.progress_callback:
+            self.progress_callback(value, maximum, self.metrics.readout(value, maximum))
+
+    def record_result(self, idx, success, total_entries, row=None):
+        if self.job_queue:
+            with self._lock:
+                self._claimed.discard(idx)
+            if not self.job_queue.complete(idx, success, self.queue_owner):
+                self.log(f"Entry {idx + 1} was taken over by another worker after its lease expired; "
+                         f"result not recorded", level=logging.WARNING)
+            self.renew_lease()
+        else:
+            self.journal.record(idx, success)
+        if success and row is not None and self.submitted_index:
+            self.submitted_index.add(self.website_url, row, os.path.abspath(self.file_path))
+        self.metrics.inc('rows_succeeded' if success else 'rows_failed')
+        self.metrics.row_completed()
+        with self._lock:
+            if success:
+                self.success_count += 1
+            else:
+                self.failure_count += 1
+            self.completed_count += 1
+            completed = self.completed_count
+        self.update_progress(completed, total_entries)
+        self.export_metrics()
+
+    def export_metrics(self, force=False):
+        # Every metrics_interval seconds: log the rate readout and write the snapshots
+        if not force and time.monotonic() - self._last_export < self.metrics_interval:
+            return
+        if not self._export_lock.acquire(blocking=force):
+            return
+        try:
+            self._last_export = time.monotonic()
+            snapshot = self.metrics.snapshot(self.completed_count, self.total_entries)
+            self.log(f"Progress: {self.metrics.readout(self.completed_count, self.total_entries)}")
+            if self.metrics_prom:
+                self.metrics.write_prometheus(self.metrics_prom, snapshot)
+            if self.metrics_jsonl:
+                self.metrics.append_jsonl(self.metrics_jsonl, snapshot)
+        except OSError as e:
+            self.log(f"Could not write metrics: {e}", level=logging.WARNING)
+        finally:
+            self._export_lock.release()
+
+    def prompt(self, kind, message):
+        if kind == PROMPT_MANUAL_LOGIN and self.headless:
+            raise FormFillerError("Manual login is not possible in headless mode. Provide a password instead.")
+        if self.prompt_callback:
+            return self.prompt_callback(kind, message)
+        # Without a front-end nobody can log in by hand; assume an unverified
+        # automatic login worked and let the iframe check decide.
+        return kind == PROMPT_CONFIRM_LOGIN
+
+    def sniff_delimiter(self):
+        with open(self.file_path, 'r', newline='') as f:
+            sample = f.read(8192)
+
+        try:
+            dialect = csv.Sniffer().sniff(sample)
+            delimiter = dialect.delimiter
+            self.log(f"Detected CSV delimiter: '{delimiter}'")
+        except csv.Error:
+            self.log("Could not detect CSV delimiter, assuming comma ','")
+            delimiter = ','
+        return delimiter
+
+    def count_rows(self, limit=0):
+        # Cheap count for progress reporting; stops early once limit is reached
+        if self.file_type in ('parquet', 'arrow'):
+            pa = import_pyarrow()
+            if self.file_type == 'parquet':
+                # Row count is in the footer, no data pages are read
+                count = pa.parquet.ParquetFile(self.file_path, memory_map=True).metadata.num_rows
+            else:
+                with pa.memory_map(self.file_path) as source:
+                    count = self.open_arrow(pa, source).read_all().num_rows
+            return min(count, limit) if limit else count
+        count = 0
+        with open(self.file_path, 'rb') as f:
+            for line in f:
+                if line.strip():
+                    count += 1
+                    if limit and count >= limit:
+                        break
+        return count
+
+    def cached_session(self):
+        if not self.session_cache:
+            return None
+        storage_state = self.session_cache.load(self.website_url)
+        if storage_state:
+            self.log("Starting from a cached login session")
+        return storage_state
+
+    def save_session(self, storage_state):
+        if self.session_cache:
+            self.session_cache.save(self.website_url, storage_state)
+            self.log(f"Saved login session to {self.session_cache.path_for(self.website_url)}")
+
+    def reject_cached_session(self):
+        self.log("Cached login session was rejected, logging in again...")
+        self.session_cache.invalidate(self.website_url)
+
+    def load_data(self, start_row=0):
+        # Yields (chunk, invalid) pairs: a DataFrame of strings (None where empty),
+        # indexed by row number in the file, and the pre-flight problems of its bad
+        # rows. Rows before start_row or past max_entries_to_process are never parsed.
+        limit = None
+        if self.max_entries_to_process > 0:
+            limit = max(0, self.max_entries_to_process - start_row)
+
+        readers = {'csv': self.read_csv, 'parquet': self.read_parquet,
+                   'arrow': self.read_arrow, 'jsonl': self.read_jsonl}
+        if self.file_type not in readers:
+            raise FormFillerError(f"Unsupported data file type: {self.file_type}")
+        chunks = readers[self.file_type](start_row, limit)
+        try:
+            while True:
+                started = time.perf_counter()
+                chunk = next(chunks, None)
+                if chunk is None:
+                    break
+                self.metrics.observe('data_load', time.perf_counter() - started)
+                invalid = pd.Series(dtype=object)
+                if self.validator:
+                    with self.metrics.span('preflight'):
+                        chunk, invalid = self.validator.check(chunk)
+                    if len(invalid):
+                        self.report_invalid(chunk, invalid)
+                # None for empty cells, so the fill loop needs no per-cell NaN checks
+                chunk = chunk.astype(object).where(chunk.notna(), None)
+                yield chunk, invalid
+        finally:
+            chunks.close()
+
+    def read_csv(self, start_row, limit):
+        delimiter = self.sniff_delimiter()
+        reader = pd.read_csv(self.file_path, delimiter=delimiter, header=None, dtype=str,
+                             chunksize=self.chunk_size, nrows=limit, skiprows=start_row)
+        with reader:
+            for chunk in reader:
+                headers = list(DEFAULT_HEADERS)
+                if len(chunk.columns) != len(headers):
+                    headers = [f'col_{i}' for i in range(len(chunk.columns))]
+                chunk.columns = headers
+                if start_row:
+                    chunk.index += start_row
+                yield chunk
+
+    # Parquet, Arrow and JSONL carry their own column names, which are kept;
+    # mapping columns can refer to them by name or position.
+
+    def read_parquet(self, start_row, limit):
+        pa = import_pyarrow()
+        parquet_file = pa.parquet.ParquetFile(self.file_path, memory_map=True)
+        # Whole row groups before start_row are never decoded
+        row_groups, first_row = [], 0
+        for i in range(parquet_file.metadata.num_row_groups):
+            rows = parquet_file.metadata.row_group(i).num_rows
+            if row_groups or first_row + rows > start_row:
+                row_groups.append(i)
+            else:
+                first_row += rows
+        batches = parquet_file.iter_batches(batch_size=self.chunk_size, row_groups=row_groups)
+        yield from self.slice_batches(batches, first_row, start_row, limit)
+
+    def read_arrow(self, start_row, limit):
+        pa = import_pyarrow()
+        with pa.memory_map(self.file_path) as source:
+            # Batches point into the mapped file; only the chunk being converted is copied
+            table = self.open_arrow(pa, source).read_all()
+            end = table.num_rows if limit is None else min(table.num_rows, start_row + limit)
+            for offset in range(start_row, end, self.chunk_size):
+                chunk = as_text(table.slice(offset, min(self.chunk_size, end - offset)).to_pandas())
+                chunk.index = pd.RangeIndex(offset, offset + len(chunk))
+                yield chunk
+
+    @staticmethod
+    def open_arrow(pa, source):
+        try:
+            return pa.ipc.open_file(source)
+        except pa.ArrowInvalid:
+            source.seek(0)
+            return pa.ipc.open_stream(source)
+
+    def read_jsonl(self, start_row, limit):
+        # One JSON object per line; skipped lines are not parsed
+        with open(self.file_path, 'r', encoding='utf-8') as f:
+            lines = (line for line in f if line.strip())
+            lines = itertools.islice(lines, start_row, None if limit is None else start_row + limit)
+            row = start_row
+            columns = None
+            while True:
+                batch = list(itertools.islice(lines, self.chunk_size))
+                if not batch:
+                    break
+                chunk = pd.DataFrame.from_records([json.loads(line) for line in batch])
+                # Keys can come in any order or be left out; later chunks follow the first one's columns
+                if columns is None:
+                    columns = chunk.columns
+                else:
+                    chunk = chunk.reindex(columns=columns)
+                chunk = as_text(chunk)
+                chunk.index = pd.RangeIndex(row, row + len(chunk))
+                row += len(chunk)
+                yield chunk
+
+    def slice_batches(self, batches, row, start_row, limit):
+        # Trims record batches to [start_row, start_row + limit) and indexes them by file row
+        end = None if limit is None else start_row + limit
+        for batch in batches:
+            batch_start, row = row, row + batch.num_rows
+            if row <= start_row:
+                continue
+            offset = max(0, start_row - batch_start)
+            length = batch.num_rows - offset
+            if end is not None:
+                length = min(length, end - batch_start - offset)
+            if length <= 0:
+                break
+            chunk = as_text(batch.slice(offset, length).to_pandas())
+            chunk.index = pd.RangeIndex(batch_start + offset, batch_start + offset + length)
+            yield chunk
+            if end is not None and row >= end:
+                break
+
+    def report_invalid(self, chunk, invalid):
+        self.invalid_count += len(invalid)
+        report = chunk.loc[invalid.index].copy()
+        report.insert(0, 'problem', invalid)
+        report.insert(0, 'entry', report.index + 1)
+        report = report[~report.index.isin(self.reported_invalid)]
+        if len(report):
+            new_file = not os.path.exists(self.invalid_file) or os.path.getsize(self.invalid_file) == 0
+            report.to_csv(self.invalid_file, mode='a', header=new_file, index=False)
+        action = "skipped" if self.preflight == 'quarantine' else "filled anyway"
+        self.log(f"Pre-flight: {len(invalid)} invalid entries between {invalid.index[0] + 1} and "
+                 f"{invalid.index[-1] + 1} {action}, see {self.invalid_file}", level=logging.WARNING)
+
+    def open_invalid_report(self, resume):
+        # A fresh run starts a new report, like the journal; a resumed run only adds entries not reported yet
+        self.reported_invalid = set()
+        if not os.path.exists(self.invalid_file):
+            return
+        if resume and os.path.getsize(self.invalid_file) > 0:
+            self.reported_invalid = set(pd.read_csv(self.invalid_file, usecols=['entry'])['entry'] - 1)
+        elif not resume:
+            os.remove(self.invalid_file)
+
+    def check_data(self):
+        # Runs only the pre-flight checks over the file; no browser is started
+        self.validator = self.validator or RowValidator()
+        self.open_invalid_report(False)
+        checked = 0
+        for chunk, invalid in self.load_data():
+            checked += len(chunk)
+        self.log(f"Pre-flight checked {checked} entries, {self.invalid_count} invalid")
+        return {'total': checked, 'invalid': self.invalid_count}
+
+    def iter_rows(self, chunks, skip=()):
+        # Plain tuples avoid building a Series and a dict for every row
+        for chunk, invalid in chunks:
+            if len(invalid) and self.preflight == 'quarantine':
+                # Quarantined rows count as failed entries and never reach the browser
+                for idx in invalid.index:
+                    if idx not in skip:
+                        self.record_result(idx, False, self.total_entries)
+                chunk = chunk.drop(invalid.index)
+            if self.submitted_index:
+                chunk = self.drop_submitted(chunk, skip)
+            for row in chunk.itertuples(index=True, name=None):
+                if row[0] not in skip:
+                    yield row[0], row[1:]
+
+    def drop_submitted(self, chunk, skip):
+        # One index query per chunk; rows submitted in an earlier run count as done
+        hashes = [SubmittedIndex.row_hash(row) for row in chunk.itertuples(index=False, name=None)]
+        found = self.submitted_index.submitted(self.website_url, hashes)
+        if not found:
+            return chunk
+        duplicate = [hash_value in found for hash_value in hashes]
+        for idx in chunk.index[duplicate]:
+            if idx not in skip:
+                self.duplicate_count += 1
+                self.record_result(idx, True, self.total_entries)
+        self.log(f"Skipping {sum(duplicate)} entries already submitted in an earlier run", level=logging.DEBUG)
+        return chunk[[not flag for flag in duplicate]]
+
+    def prepare(self):
+        # Returns a RowFeed over the rows to process and their count
+        if self.job_queue:
+            return self.prepare_queue()
+        self.update_status("Loading data file...")
+        self.log(f"Loading data from {self.file_path}")
+
+        finished = set()
+        start_row = 0
+        if self.resume:
+            finished = self.journal.finished_rows(self.requeue_failed)
+            # Rows finish out of order with several workers; seek to the first gap
+            while start_row in finished:
+                start_row += 1
+            self.log(f"Resuming from entry {start_row + 1}; {len(finished)} entries already finished "
+                     f"according to {self.journal.path}")
+
+        self.open_invalid_report(self.resume)
+        try:
+            chunks = self.load_data(start_row)
+            first_chunk = next(chunks, None)
+            total_entries = self.count_rows(self.max_entries_to_process)
+        except Exception as e:
+            self.log(f"Error loading data file: {str(e)}", level=logging.ERROR)
+            raise FormFillerError(f"Failed to load data file: {str(e)}") from e
+
+        # --- Limit number of entries based on user input ---
+        num_to_process = self.max_entries_to_process
+        if num_to_process > 0 and total_entries >= num_to_process:
+            self.log(f"Processing the first {num_to_process} entries as requested.")
+        elif num_to_process > 0:
+            self.log(f"Requested number ({num_to_process}) is >= total entries ({total_entries}). Processing all.")
+        else:
+            self.log(f"Found {total_entries} total entries in file. Processing all entries.")
+
+        if finished:
+            total_entries -= sum(1 for idx in finished if idx < total_entries)
+            self.log(f"{total_entries} entries left to process")
+
+        if first_chunk is not None:
+            self.columns = first_chunk[0].columns.tolist()
+            chunks = itertools.chain([first_chunk], chunks)
+        self.journal.open(self.resume)
+        self.setup_fill(total_entries)
+        return RowFeed(self.iter_rows(chunks, skip=finished)), total_entries
+
+    def prepare_queue(self):
+        # Worker of a shared job queue: rows come from the queue instead of the data file
+        self.update_status("Opening job queue...")
+        self.job_queue.open()
+        self.columns = self.job_queue.meta('columns')
+        if self.columns is None:
+            raise FormFillerError(f"No entries have been loaded into {self.job_queue.path} yet")
+        total_entries = self.job_queue.remaining()
+        if self.max_entries_to_process > 0:
+            total_entries = min(total_entries, self.max_entries_to_process)
+        self.log(f"Worker {self.queue_owner} joining job queue {self.job_queue.path} "
+                 f"({self.job_queue.meta('source')}): {total_entries} entries to claim")
+        self.setup_fill(total_entries)
+        return RowFeed(self.iter_queue()), total_entries
+
+    def iter_queue(self):
+        # Claims the next batch once the last one is handed out; stops when the queue is drained
+        taken = 0
+        limit = self.max_entries_to_process
+        while not self.stop_event.is_set():
+            count = self.queue_batch if limit <= 0 else min(self.queue_batch, limit - taken)
+            if count <= 0:
+                return
+            batch = self.job_queue.claim(self.queue_owner, count)
+            if not batch:
+                return
+            self._last_renew = time.monotonic()
+            with self._lock:
+                self._claimed.update(idx for idx, _ in batch)
+            self.log(f"Claimed entries {batch[0][0] + 1} to {batch[-1][0] + 1} ({len(batch)})", level=logging.DEBUG)
+            if self.submitted_index:
+                hashes = [SubmittedIndex.row_hash(values) for _, values in batch]
+                found = self.submitted_index.submitted(self.website_url, hashes)
+                for (idx, values), hash_value in zip(batch, hashes):
+                    if hash_value in found:
+                        self.duplicate_count += 1
+                        self.record_result(idx, True, self.total_entries)
+                batch = [job for job, hash_value in zip(batch, hashes) if hash_value not in found]
+            for idx, values in batch:
+                self.renew_lease()
+                if idx not in self._claimed:
+                    continue
+                taken += 1
+                yield idx, values
+
+    def renew_lease(self):
+        # A third of the lease time between renewals leaves room for a slow entry
+        if self.job_queue and time.monotonic() - self._last_renew > self.job_queue.lease_seconds / 3:
+            self._last_renew = time.monotonic()
+            renewed = self.job_queue.renew(self.queue_owner)
+            with self._lock:
+                claimed = set(self._claimed)
+            if renewed < len(claimed):
+                # Leases that expired before this renewal may have gone to other workers
+                lost = claimed - self.job_queue.held(self.queue_owner, claimed)
+                with self._lock:
+                    self._claimed -= lost
+                if lost:
+                    self.log(f"Leases of {len(lost)} entries expired and were taken over by other workers; "
+                             f"they are not filled here", level=logging.WARNING)
+
+    def wait_for_retry(self, delay):
+        # Sleeps until a retry is due, renewing queue leases so the rows waiting here stay leased
+        deadline = time.monotonic() + delay
+        while not self.stop_event.is_set():
+            self.renew_lease()
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            if self.job_queue:
+                remaining = min(remaining, self.job_queue.lease_seconds / 6)
+            self.stop_event.wait(remaining)
+
+    def setup_fill(self, total_entries):
+        column_names = ', '.join(str(c) for c in self.columns)
+        self.log(f"Columns being processed: {column_names}")
+
+        # Compile the form mapping once; the hot loop only does lookups
+        if self.mapping_file:
+            self.plan = FillPlan.load(self.mapping_file, self.columns)
+            self.log(f"Using form mapping from {self.mapping_file}")
+        else:
+            self.plan = FillPlan.compile(DEFAULT_MAPPING, self.columns)
+        self.log(f"Fill plan: {len(self.plan.fields)} fields per block, stride {self.plan.stride}")
+
+        self.blocker = ResourceBlocker.from_profile(self.block_profile)
+        if self.blocker:
+            self.log(f"Blocking {', '.join(sorted(self.blocker.resource_types)) or 'no resource types'} "
+                     f"and {len(self.blocker.url_patterns)} URL patterns outside {', '.join(self.blocker.allow_hosts) or 'no hosts'}")
+
+        if self.submitted_index:
+            self.submitted_index.open()
+            self.log(f"Skipping entries already submitted according to {self.submitted_index.path}")
+            if not self.window_size and not self.replay:
+                self.log("Without --window or --replay the form is never submitted here, so this run adds "
+                         "no entries to the submitted index", level=logging.WARNING)
+        self.success_count = self.failure_count = self.completed_count = 0
+        self.total_entries = total_entries
+        self.update_progress(0, total_entries)
+
+    def collect_summary(self, summary):
+        summary['stopped'] = self.stop_event.is_set()
+        if self.job_queue:
+            # Other workers drain the same queue; this one reports what it finished
+            summary['total'] = self.completed_count
+        unprocessed = summary['total'] - self.completed_count
+        if unprocessed > 0 and not summary['stopped']:
+            # Only happens when every worker failed before draining the feed
+            self.log(f"{unprocessed} entries were not processed")
+            with self._lock:
+                self.failure_count += unprocessed
+        summary['success'] = self.success_count
+        summary['failure'] = self.failure_count
+        if self.blocker:
+            self.log(self.blocker.report())
+        if self.invalid_count and self.preflight == 'quarantine':
+            self.log(f"{self.invalid_count} entries failed the pre-flight checks and were not filled, see {self.invalid_file}")
+        if self.duplicate_count:
+            self.log(f"{self.duplicate_count} entries had already been submitted in earlier runs and were skipped")
+        if self.dead_letter.count:
+            self.log(f"{self.dead_letter.count} failed entries were written to {self.dead_letter.path}")
+
+    def run(self):
+        rows, total_entries = self.prepare()
+        try:
+            return self.fill_rows(rows, total_entries)
+        finally:
+            self.journal.close()
+            self.dead_letter.close()
+            if self.submitted_index:
+                self.submitted_index.close()
+            if self.job_queue:
+                released = self.job_queue.release(self.queue_owner)
+                if released:
+                    self.log(f"Released {released} claimed entries back to the job queue")
+                self.job_queue.close()
+            self.export_metrics(force=True)
+
+    def load_queue(self):
+        # Runs the pre-flight checks over the data file and adds the rows that pass to the job queue
+        self.open_invalid_report(False)
+        chunks = self.load_data()
+        first_chunk = next(chunks, None)
+        if first_chunk is None:
+            raise FormFillerError(f"No entries found in {self.file_path}")
+        self.columns = first_chunk[0].columns.tolist()
+        rows = (row for chunk, invalid in itertools.chain([first_chunk], chunks)
+                for row in (chunk.drop(invalid.index) if self.preflight == 'quarantine' else chunk)
+                .itertuples(index=True, name=None))
+        self.job_queue.open()
+        try:
+            added = self.job_queue.load(os.path.abspath(self.file_path), self.columns,
+                                        ((row[0], row[1:]) for row in rows))
+            counts, _ = self.job_queue.stats()
+        finally:
+            self.job_queue.close()
+        self.log(f"Added {added} entries to {self.job_queue.path}; "
+                 + ', '.join(f"{count} {status}" for status, count in counts.items()))
+        return added
+
+    def fill_rows(self, rows, total_entries):
+        summary = {'total': total_entries, 'success': 0, 'failure': 0, 'stopped': False}
+
+        workers = min(self.workers, max(1, total_entries))
+        if workers > (os.cpu_count() or 1):
+            self.log(f"Warning: {workers} workers requested on {os.cpu_count()} CPU cores; expect diminishing returns.")
+
+        self.log(f"Starting automation for website: {self.website_url}")
+
+        with sync_api.sync_playwright() as playwright:
+            cdp_endpoint = self.browser_endpoint
+            launch_args = []
+            if workers > 1 and not cdp_endpoint:
+                # Worker threads attach to this Chromium over CDP, since sync
+                # Playwright objects cannot be shared across threads.
+                cdp_port = find_free_port()
+                launch_args.append(f"--remote-debugging-port={cdp_port}")
+                cdp_endpoint = f"http://127.0.0.1:{cdp_port}"
+            browser = self.open_browser(playwright, launch_args)
+            try:
+                storage_state = self.cached_session()
+                context = browser.new_context(storage_state=storage_state)
+                if self.blocker:
+                    self.blocker.attach(context)
+                page = context.new_page()
+
+                self.log(f"Navigating to {self.website_url}")
+                with self.metrics.span('navigate'):
+                    page.goto(self.website_url, wait_until='networkidle')  # Wait for network idle on initial load
+
+                with self.metrics.span('login'):
+                    if storage_state and self.session_accepted(page):
+                        self.log("Cached login session accepted, skipping login.")
+                    else:
+                        if storage_state:
+                            self.reject_cached_session()
+                        if not self.login(page):
+                            self.log("User indicated login failed. Aborting.")
+                            summary['stopped'] = True
+                            return summary
+                        self.save_session(context.storage_state())
+
+                release_event = Event()
+                threads = []
+                try:
+                    if self.replay:
+                        self.replay_rows(page, rows, total_entries)
+                    elif workers > 1:
+                        threads = self.start_workers(cdp_endpoint, context.storage_state(),
+                                                     rows, workers, total_entries, release_event)
+                        for thread, done_event in threads:
+                            done_event.wait()
+                    else:
+                        with self.metrics.span('iframe_discovery'):
+                            frame = self.find_form_frame(page)
+                        self.update_status("Starting form filling...")
+                        with self.failure_traces(context) as tracer:
+                            self.process_rows(frame, rows, total_entries, tracer)
+
+                    self.collect_summary(summary)
+
+                    if not summary['stopped']:
+                        self.log("All entries processed!")
+                        self.update_status("Completed")
+                        # The front-end may block here to keep the browser open
+                        if self.finish_callback:
+                            self.finish_callback(summary)
+                    else:
+                        self.log("Automation stopped before completion.")
+                        self.update_status("Stopped")
+                finally:
+                    release_event.set()
+                    for thread, done_event in threads:
+                        thread.join()
+
+            except Exception as browser_err:
+                self.log(f"Browser/Navigation error: {str(browser_err)}", level=logging.ERROR)
+                if self.error_callback:
+                    self.log("Browser window kept open for inspection despite error")
+                    self.error_callback(browser_err)
+                raise
+
+            finally:
+                # On a browser server this only closes our contexts and disconnects
+                if browser.is_connected():
+                    browser.close()
+
+        return summary
+
+    def open_browser(self, playwright, launch_args=()):
+        if self.browser_endpoint:
+            self.log(f"Attaching to browser server at {self.browser_endpoint}")
+            with self.metrics.span('browser_connect'):
+                return playwright.chromium.connect_over_cdp(self.browser_endpoint)
+        with self.metrics.span('browser_launch'):
+            return playwright.chromium.launch(headless=self.headless, args=list(launch_args))
+
+    def replay_rows(self, page, rows, total_entries):
+        # HTTP replay: the browser records the form's submit request once and
+        # refreshes its tokens when needed; entries are posted from a thread pool
+        with self.metrics.span('iframe_discovery'):
+            frame = self.find_form_frame(page)
+        first_row = next(rows, None)
+        if first_row is None:
+            return
+        with self.metrics.span('replay_record'):
+            template = self.record_submit(page, frame, first_row[1])
+        # The recorded post was held back, so the first entry is replayed like the others
+        rows = itertools.chain([first_row], rows)
+        per_post = len(template.block_names)
+        client = ReplayClient(template.url)
+        retry_queue = RetryQueue()
+        in_flight = {}
+        needs_refresh = False
+        refreshes = 0
+        self.update_status(f"Replaying entries with up to {self.replay_concurrency} posts in flight...")
+        try:
+            with ThreadPoolExecutor(max_workers=self.replay_concurrency) as executor:
+                while True:
+                    while not self.pause_event.is_set() and not self.stop_event.is_set():
+                        self.pause_event.wait(0.2)
+                    while (not needs_refresh and not self.stop_event.is_set()
+                           and len(in_flight) < self.replay_concurrency):
+                        job = retry_queue.pop_due()
+                        jobs = [job] if job else [RetryJob(idx, row, slot) for slot, (idx, row)
+                                                  in enumerate(itertools.islice(rows, per_post))]
+                        if not jobs:
+                            break
+                        # A row the form cannot take fails on its own instead of failing its whole post
+                        blocks = []
+                        for job in list(jobs):
+                            try:
+                                blocks.append(template.block_values(self.plan, job.row))
+                            except FillFailure as e:
+                                job.attempts += 1
+                                self.attempt_failed(job, e, total_entries)
+                                jobs.remove(job)
+                        if not jobs:
+                            continue
+                        for _ in jobs:
+                            start_wait = self.pacer.row_start_wait()
+                            if start_wait:
+                                self.stop_event.wait(start_wait)
+                        for job in jobs:
+                            self.log(f"Replaying entry {job.idx + 1}" + (f" (attempt {job.attempts + 1})" if job.attempts else ""))
+                        in_flight[executor.submit(self.replay_post, client, template, blocks)] = jobs
+                    if not in_flight:
+                        if self.stop_event.is_set():
+                            break
+                        if needs_refresh:
+                            # Nothing is in flight any more, so the browser can be used
+                            refreshes += 1
+                            if refreshes > REPLAY_MAX_REFRESHES:
+                                raise FormFillerError("The site keeps rejecting replayed posts after refreshing the session")
+                            self.refresh_tokens(page, template)
+                            needs_refresh = False
+                            continue
+                        if retry_queue:
+                            self.wait_for_retry(retry_queue.wait_time())
+                            continue
+                        break
+                    else:
+                        done, _ = wait_futures(in_flight, timeout=1.0, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            jobs = in_flight.pop(future)
+                            try:
+                                future.result()
+                            except ReplayAuthError as e:
+                                self.log(f"Replayed post rejected: {str(e)}", level=logging.WARNING)
+                                needs_refresh = True
+                                for job in jobs:
+                                    retry_queue.push(job, 0)
+                                continue
+                            except Exception as e:
+                                for job in jobs:
+                                    job.attempts += 1
+                                    delay = self.attempt_failed(job, e, total_entries)
+                                    if delay is not None:
+                                        retry_queue.push(job, delay)
+                                continue
+                            refreshes = 0
+                            for job in jobs:
+                                self.log(f"Replayed entry {job.idx + 1}")
+                                self.metrics.observe('row', time.perf_counter() - job.started)
+                                self.record_result(job.idx, True, total_entries, job.row)
+        finally:
+            client.close()
+
+    def record_submit(self, page, frame, row):
+        # Fills the first entry and clicks submit; the post is captured and aborted
+        self.update_status("Recording the form's submit request...")
+        per_post = max(1, self.window_size)
+        self.fill_form(frame, row, 0)
+        for field_plan, element_id in zip(self.plan.fields, self.plan.block_ids(0)):
+            if field_plan.field_type == 'select' and field_plan.options is None:
+                options = frame.locator(f"select#{element_id}").evaluate(SELECT_OPTIONS_SCRIPT, timeout=5000)
+                field_plan.learn_options(options)
+        block_names = frame.evaluate(FIELD_NAMES_SCRIPT, [self.plan.block_ids(slot) for slot in range(per_post)])
+
+        captured = []
+
+        # Only the form frame's own submit; beacons and XHRs fired on the click go through
+        def is_form_post(request):
+            return request.method == 'POST' and request.is_navigation_request() and request.frame == frame
+
+        def on_request(request):
+            if is_form_post(request) and not captured:
+                captured.append(request)
+
+        def hold_post(route):
+            if is_form_post(route.request):
+                route.abort()
+            else:
+                route.continue_()
+
+        page.on("request", on_request)
+        page.route("**/*", hold_post)
+        try:
+            frame.locator(SUBMIT_SELECTOR).first.click(timeout=10000)
+            deadline = time.monotonic() + 10
+            while not captured and time.monotonic() < deadline:
+                page.wait_for_timeout(100)
+        finally:
+            page.remove_listener("request", on_request)
+            page.unroute("**/*", hold_post)
+        if not captured:
+            raise FormFillerError("No form submit seen in the form frame after clicking the submit button")
+
+        template = SubmitTemplate.from_request(captured[0], block_names)
+        template.cookie = cookie_header(page.context.cookies(template.url))
+        if len(template.block_names) < per_post:
+            self.log(f"The form only posts {len(template.block_names)} entry blocks; sending that many per post",
+                     level=logging.WARNING)
+        self.log(f"Recorded the form post to {template.url} ({len(template.fields)} fields, "
+                 f"{len(template.block_names)} entries per post)")
+        return template
+
+    def refresh_tokens(self, page, template):
+        self.log("Reloading the form in the browser for fresh tokens and cookies")
+        self.update_status("Refreshing session...")
+        with self.metrics.span('replay_refresh'):
+            page.goto(self.website_url, wait_until='networkidle')
+            frame = self.find_form_frame(page)
+            template.update_tokens(frame.evaluate(HIDDEN_FIELDS_SCRIPT),
+                                   cookie_header(page.context.cookies(template.url)))
+
+    def replay_post(self, client, template, blocks):
+        # Runs on a sender thread; raises if the site did not take the entries
+        body = template.body(blocks)
+        with self.metrics.span('replay_post'):
+            status, headers, data = client.post(body, template.request_headers())
+        if status in REPLAY_AUTH_STATUSES:
+            raise ReplayAuthError(f"HTTP {status}")
+        if status >= 400:
+            raise FillFailure(FAILURE_SUBMIT, f"Form post answered with HTTP {status}")
+        if self.replay_success and 200 <= status < 300 and self.replay_success not in data.decode('utf-8', 'replace'):
+            raise FillFailure(FAILURE_SUBMIT, f"Form post response does not contain '{self.replay_success}'")
+
+    def settle_after_login(self, page):
+        if not self.pacer.adaptive:
+            page.wait_for_timeout(5000)
+            return
+        # Wait for the page to actually be ready rather than a fixed 5 seconds
+        page.wait_for_load_state('networkidle')
+        try:
+            page.locator(LOGGED_IN_SELECTOR).first.wait_for(state="attached", timeout=5000)
+        except sync_api.TimeoutError:
+            pass
+
+    def session_accepted(self, page):
+        try:
+            page.locator(LOGGED_IN_SELECTOR).first.wait_for(state="attached", timeout=10000)
+            return True
+        except sync_api.TimeoutError:
+            return False
+
+    def login(self, page):
+        # Returns False if the user aborted during a login prompt
+        if not self.password:
+            self.log("No password provided, waiting for manual login...")
+            self.update_status("Waiting for manual login...")
+            self.prompt(PROMPT_MANUAL_LOGIN,
+                        "Please log in to the website in the browser window. Click OK here when you are logged in and ready to proceed.")
+            self.log("User confirmed login. Waiting for page elements to load...")
+            self.settle_after_login(page)
+            return True
+
+        try:
+            self.log("Password provided, attempting automatic login...")
+
+            # Wait for page to load completely
+            page.wait_for_load_state('networkidle')
+
+            # First attempt - look for password field directly in main document
+            pw_field_exists = page.locator('input[type="password"]').count() > 0
+
+            if pw_field_exists:
+                # Password field found directly on page
+                self.log("Found password field in main document")
+                pw_input = page.locator('input[type="password"]').first
+                pw_input.fill(self.password)
+
+                # Find the nearest form or submit button
+                submit_button = page.locator('button[type="submit"], input[type="submit"]')
+                if submit_button.count() > 0:
+                    submit_button.first.click()
+                    self.log("Submitted password form, waiting for login to complete...")
+                else:
+                    # Try to submit using Enter key if no submit button found
+                    pw_input.press("Enter")
+                    self.log("Submit button not found, pressed Enter key instead")
+            else:
+                # Check for iframes
+                self.log("Password field not found in main document, checking iframes...")
+                frames = page.frames
+                self.log(f"Found {len(frames)} frames in the page")
+
+                for frame in frames:
+                    try:
+                        # Check if this frame has a password field
+                        if frame.locator('input[type="password"]').count() > 0:
+                            self.log("Found password field in iframe")
+                            frame.locator('input[type="password"]').first.fill(self.password)
+
+                            # Try to find a submit button
+                            if frame.locator('button[type="submit"], input[type="submit"]').count() > 0:
+                                frame.locator('button[type="submit"], input[type="submit"]').first.click()
+                                self.log("Submitted password form in iframe, waiting for login to complete...")
+                                break
+                            else:
+                                # Try to submit using Enter key if no submit button found
+                                frame.locator('input[type="password"]').first.press("Enter")
+                                self.log("Submit button not found in iframe, pressed Enter key instead")
+                                break
+                    except Exception as frame_err:
+                        self.log(f"Error checking iframe: {frame_err}", level=logging.WARNING)
+                        continue
+
+            # Wait for login to complete - look for content that indicates success
+            page.wait_for_load_state('networkidle')
+            self.settle_after_login(page)
+
+            # Check for successful login by looking for the form iframe
+            if page.locator(FORM_IFRAME_SELECTOR).count() > 0 or page.locator('#element_0').count() > 0:
+                self.log("Login successful, proceeding to form filling.")
+                return True
+
+            # Take a screenshot for debugging
+            screenshot_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "login_debug.png")
+            page.screenshot(path=screenshot_path)
+            self.log(f"Login may have failed. Saved screenshot to {screenshot_path}", level=logging.WARNING)
+
+            # Ask user to confirm if login was successful
+            if not self.prompt(PROMPT_CONFIRM_LOGIN, "Was the login successful? Click Yes to continue, No to abort."):
+                self.stop_event.set()
+                return False
+            return True
+
+        except FormFillerError:
+            raise
+        except Exception as e:
+            self.log(f"Automatic login failed: {e}", level=logging.WARNING)
+
+            # Fall back to manual login
+            self.log("Falling back to manual login...")
+            self.prompt(PROMPT_MANUAL_LOGIN,
+                        "Automatic login failed. Please log in manually in the browser window. Click OK when finished.")
+            self.log("User confirmed manual login. Waiting for page elements to load...")
+            self.settle_after_login(page)
+            return True
+
+    def find_form_frame(self, page):
+        self.log("Looking for the form iframe...")
+        try:
+            # Wait for the iframe to appear
+            iframe_locator = page.locator(FORM_IFRAME_SELECTOR)
+            iframe_locator.wait_for(state="attached", timeout=20000)
+            self.log("Form iframe found. Switching context.")
+            # Get the frame object
+            frame = None
+            for f in page.frames:
+                if FORM_HOST in f.url:
+                    frame = f
+                    break
+            if not frame:
+                raise FormFillerError("Form iframe not found after login.")
+        except Exception as e:
+            self.log(f"Error: Could not find or switch to the form iframe: {e}", level=logging.ERROR)
+            self.update_status("Error: Form iframe not found.")
+            raise FormFillerError("Form iframe not found after login.")
+
+        # Now check for #element_0 inside the iframe
+        try:
+            self.log("Checking if the initial form element (#element_0) is present in the iframe...")
+            frame.locator("#element_0").wait_for(state="visible", timeout=20000)
+            self.log("Initial form element found in iframe. Proceeding with form filling.")
+        except sync_api.TimeoutError:
+            self.log("Error: Initial form element (#element_0) did not become visible in iframe. Aborting.", level=logging.ERROR)
+            self.update_status("Error: Form not loaded in iframe.")
+            raise FormFillerError("Initial form element #element_0 not found in iframe after login.")
+
+        return frame
+
+    def start_workers(self, cdp_endpoint, storage_state, rows, workers, total_entries, release_event):
+        # Workers pull rows from the shared feed, so a slow context never holds up the others
+        self.update_status(f"Starting form filling with {workers} workers...")
+
+        threads = []
+        for worker_id in range(1, workers + 1):
+            done_event = Event()
+            thread = Thread(target=self.run_worker,
+                            args=(worker_id, cdp_endpoint, storage_state, rows, total_entries,
+                                  done_event, release_event),
+                            daemon=True)
+            thread.start()
+            threads.append((thread, done_event))
+        return threads
+
+    def run_worker(self, worker_id, cdp_endpoint, storage_state, rows, total_entries, done_event, release_event):
+        log_prefix.set(f"[worker {worker_id}]")
+        try:
+            with sync_api.sync_playwright() as playwright:
+                with self.metrics.span('browser_connect'):
+                    browser = playwright.chromium.connect_over_cdp(cdp_endpoint)
+                # Isolated context that starts from the main context's login state
+                context = browser.new_context(storage_state=storage_state)
+                if self.blocker:
+                    self.blocker.attach(context)
+                page = context.new_page()
+                self.log(f"Navigating to {self.website_url}")
+                with self.metrics.span('navigate'):
+                    page.goto(self.website_url, wait_until='networkidle')
+                with self.metrics.span('iframe_discovery'):
+                    frame = self.find_form_frame(page)
+                with self.failure_traces(context) as tracer:
+                    self.process_rows(frame, rows, total_entries, tracer)
+                done_event.set()
+                # Keep this context's form open until the front-end releases the browser
+                release_event.wait()
+        except Exception as e:
+            self.log(f"Worker failed: {str(e)}", level=logging.WARNING)
+        finally:
+            done_event.set()
+
+    @contextmanager
+    def failure_traces(self, context):
+        # A TraceRing on the context with --trace-failures, otherwise None
+        if not self.trace_dir:
+            yield None
+            return
+        tracer = TraceRing(context.tracing, self.trace_dir, self.trace_keep, self.log).start()
+        try:
+            yield tracer
+        finally:
+            tracer.close()
+
+    def process_rows(self, frame, rows, total_entries, tracer=None):
+        success_count = 0
+        failure_count = 0
+        # Rows waiting for another attempt; the loop keeps taking new rows meanwhile
+        retry_queue = RetryQueue()
+        window = FormWindow(self.window_size)
+
+        while True:
+            if self.stop_event.is_set():
+                self.log("Automation stopped by user")
+                break
+
+            while not self.pause_event.is_set() and not self.stop_event.is_set():
+                time.sleep(0.5)
+
+            job = retry_queue.pop_due()
+            if job is None:
+                next_row = None if window.full() else next(rows, None)
+                if next_row is None:
+                    if retry_queue:
+                        # Main pass or window is done; sleep until the next retry is due
+                        self.wait_for_retry(retry_queue.wait_time())
+                        continue
+                    if not window.full():
+                        break
+                    self.submit_window(frame, window, total_entries)
+                    continue
+                # slot is the block position in this copy of the form; idx is the row in the file
+                idx, row = next_row
+                job = RetryJob(idx, row, window.next_slot())
+
+            start_wait = self.pacer.row_start_wait()
+            if start_wait:
+                self.stop_event.wait(start_wait)
+
+            if self.stop_event.is_set():
+                continue
+
+            entry_num = job.idx + 1
+            if job.attempts:
+                self.update_status(f"Retrying entry {entry_num} (attempt {job.attempts + 1})")
+            else:
+                self.update_status(f"Processing entry {entry_num} of {total_entries}")
+                entry_dict = dict(zip(self.columns, job.row))
+                self.log(f"Processing entry {entry_num}: {entry_dict}")
+
+            if tracer:
+                tracer.begin(job)
+            try:
+                started = time.monotonic()
+                # Pass the block position (slot) to fill_form; a retry goes back into the same block
+                with self.metrics.span('retry' if job.attempts else 'attempt'):
+                    ready = self.lookahead > 0 and self.block_ready(frame, job.slot, window)
+                    self.fill_form(frame, job.row, job.slot, ready=ready)
+            except Exception as e:
+                job.attempts += 1
+                if tracer:
+                    tracer.end(job, failed=True)
+                delay = self.attempt_failed(job, e, total_entries)
+                if delay is None:
+                    failure_count += 1
+                    if tracer:
+                        self.save_traces(tracer, job)
+                    if window.size:
+                        self.clear_block(frame, job.slot)
+                else:
+                    retry_queue.push(job, delay)
+                # Adaptive pacing slows every worker down after errors
+                self.stop_event.wait(self.pacer.attempt_failed(delay is None))
+                continue
+
+            if tracer:
+                tracer.end(job, failed=False)
+            self.log(f"Successfully filled form {entry_num} ({self.plan.block_range(job.slot)})")
+            success_count += 1
+            self.metrics.observe('row', time.perf_counter() - job.started)
+            self.row_filled(window, job, total_entries)
+
+            delay = self.pacer.row_succeeded(time.monotonic() - started)
+            if delay and self.completed_count < total_entries:
+                self.log(f"Waiting {delay:g} seconds before processing next entry", level=logging.DEBUG)
+                self.stop_event.wait(delay)
+
+        if window.pending() and not self.stop_event.is_set():
+            self.submit_window(frame, window, total_entries)
+        return success_count, failure_count
+
+    def block_ready(self, frame, slot, window):
+        # One round trip: waits (in the page) for this block and starts the waits for the next lookahead blocks
+        last = slot + self.lookahead
+        if window.size:
+            last = min(last, window.size - 1)
+        blocks = [[block, self.plan.block_ids(block)] for block in range(slot, last + 1)]
+        try:
+            with self.metrics.span('block_ready'):
+                return frame.evaluate(BLOCK_READY_SCRIPT, [slot, blocks, 10000]) is True
+        except Exception as e:
+            self.log(f"Readiness check for {self.plan.block_range(slot)} failed, waiting per field: {str(e)}",
+                     level=logging.DEBUG)
+            return False
+
+    def save_traces(self, tracer, job):
+        try:
+            saved = tracer.save(job)
+        except OSError as e:
+            self.log(f"Could not save the trace of entry {job.idx + 1}: {e}", level=logging.WARNING)
+            return
+        if saved:
+            self.log(f"Trace of entry {job.idx + 1} saved to {', '.join(saved)} "
+                     f"(open with `playwright show-trace`)", level=logging.ERROR)
+        else:
+            self.log(f"No trace left for entry {job.idx + 1}; raise --trace-keep to keep more attempts",
+                     level=logging.WARNING)
+
+    def row_filled(self, window, job, total_entries):
+        if window.size:
+            window.filled.append(job)
+        else:
+            # Nothing is submitted in this mode, so the row stays out of the submitted index
+            self.record_result(job.idx, True, total_entries)
+
+    def window_submitted(self, window, total_entries, error=None):
+        # Records the window's rows once the site has (or has not) taken the submit
+        for job in window.filled:
+            if error is None:
+                self.record_result(job.idx, True, total_entries, job.row)
+            else:
+                self.dead_letter.write(job, FAILURE_SUBMIT, error, self.columns)
+                self.record_result(job.idx, False, total_entries)
+        window.reset()
+
+    def clear_block(self, frame, slot):
+        try:
+            frame.evaluate(CLEAR_BLOCK_SCRIPT, self.plan.block_ids(slot))
+        except Exception as e:
+            self.log(f"Could not clear {self.plan.block_range(slot)}: {str(e)}", level=logging.WARNING)
+
+    def submit_window(self, frame, window, total_entries):
+        self.log(f"Submitting {len(window.filled)} entries ({window.slots} form blocks)")
+        self.update_status("Submitting form...")
+        form_url = frame.url
+        try:
+            with self.metrics.span('submit'):
+                with frame.expect_navigation(timeout=30000):
+                    frame.locator(SUBMIT_SELECTOR).first.click(timeout=10000)
+        except Exception as e:
+            self.log(f"Submitting the form failed: {str(e)}", level=logging.ERROR)
+            self.window_submitted(window, total_entries, e)
+            raise FormFillerError(f"Form submit failed: {str(e)}") from e
+        self.window_submitted(window, total_entries)
+        # A fresh copy of the form starts again at element_0
+        with self.metrics.span('form_reload'):
+            frame.goto(form_url, wait_until='domcontentloaded')
+            frame.locator(f"#{self.plan.block_ids(0)[0]}").wait_for(state="visible", timeout=20000)
+
+    def attempt_failed(self, job, error, total_entries):
+        # Returns the backoff before the next attempt, or None once the row is given up
+        entry_num = job.idx + 1
+        kind = classify_failure(error)
+        self.metrics.inc(f"failures_{kind}")
+        self.log(f"Error processing entry {entry_num} ({self.plan.block_range(job.slot)}): {str(error)} [{kind}], attempt {job.attempts}", level=logging.WARNING)
+        if kind in PERMANENT_FAILURES or job.attempts >= self.max_retries:
+            if kind in PERMANENT_FAILURES:
+                self.log(f"Entry {entry_num} cannot succeed on retry ({kind}); written to {self.dead_letter.path}", level=logging.ERROR)
+            else:
+                self.log(f"Failed to process entry {entry_num} after {job.attempts} attempts; written to {self.dead_letter.path}", level=logging.ERROR)
+            self.dead_letter.write(job, kind, error, self.columns)
+            self.metrics.observe('row', time.perf_counter() - job.started)
+            self.record_result(job.idx, False, total_entries)
+            return None
+        self.metrics.inc('retries')
+        delay = retry_backoff(job.attempts, self.retry_backoff)
+        self.log(f"Retrying entry {entry_num} in {delay:.1f} seconds", level=logging.DEBUG)
+        return delay
+
+    def batch_fields(self, row_data, idx):
+        return [(field_plan.column, element_id, field_plan.field_type, value_str, field_plan.select_by)
+                for field_plan, element_id, value_str in self.plan.block(row_data, idx)]
+
+    def check_batch_results(self, fields, results):
+        # Returns the columns to retry on the per-field path; raises on values the form cannot take
+        fallback_columns = []
+        unmatched = []
+        for (col_index, element_id, field_type, value_str, select_by), result in zip(fields, results):
+            element_description = f"field {col_index+1} ({element_id})"
+            status = result.get('status')
+            if status == 'selected':
+                self.log(f"Selected option for {element_description}: {value_str}", level=logging.DEBUG)
+            elif status == 'filled':
+                self.log(f"Filled {element_description} with value: {value_str}", level=logging.DEBUG)
+            elif status in BATCH_FALLBACK_STATUSES:
+                self.log(f"Batch fill {status} for {element_description}, falling back to per-field fill", level=logging.DEBUG)
+                fallback_columns.append(col_index)
+            else:
+                self.log(f"Could not select option for {element_description} by {select_by}: {value_str}", level=logging.WARNING)
+                unmatched.append(element_id)
+        if unmatched:
+            raise FillFailure(FAILURE_SELECT_MISMATCH, f"No matching option for {', '.join(unmatched)}")
+        return fallback_columns
+
+    def fill_form_batched(self, frame, row_data, idx, ready=False):
+        fields = self.batch_fields(row_data, idx)
+        if not fields:
+            return
+        if self.pacer.adaptive and not ready:
+            # Wait until the whole block is rendered instead of sleeping between rows
+            selector = f"#{self.plan.last_element_id(idx)}"
+            last_field = frame.locator(selector)
+            try:
+                last_field.wait_for(state="attached", timeout=10000)
+            except sync_api.TimeoutError:
+                if last_field.count() == 0:
+                    self.log(f"Could not find element {selector} ending {self.plan.block_range(idx)}", level=logging.WARNING)
+                    raise FillFailure(FAILURE_ELEMENT_MISSING, f"Element not found: {selector}")
+                raise
+        with self.metrics.span('batch_evaluate'):
+            results = frame.evaluate(BATCH_FILL_SCRIPT, [list(field[1:]) for field in fields])
+        fallback_columns = self.check_batch_results(fields, results)
+        if fallback_columns:
+            self.fill_form(frame, row_data, idx, columns=fallback_columns)
+
+    def fill_form(self, frame, row_data, idx, columns=None, ready=False):
+        # ready: the block is known to be visible, so fields are filled without waiting for them first
+        if self.batch_fill and columns is None:
+            return self.fill_form_batched(frame, row_data, idx, ready)
+        for field_plan, element_id, value_str in self.plan.block(row_data, idx):
+            if columns is not None and field_plan.column not in columns:
+                continue
+            selector = field_plan.selector(element_id)
+            element_description = f"field {field_plan.column+1} ({element_id})"
+            try:
+                self.log(f"Attempting to locate {element_description} with selector: {selector}", level=logging.DEBUG)
+                field = frame.locator(selector)
+                if ready:
+                    found = True
+                else:
+                    with self.metrics.span('field_wait'):
+                        field.wait_for(state="visible", timeout=10000)
+                        found = field.count() > 0
+                if found:
+                    # The element kind never changes between blocks; look it up once
+                    if field_plan.tag_name is None:
+                        with self.metrics.span('field_evaluate'):
+                            field_plan.tag_name = field.evaluate("(element) => element.tagName.toLowerCase()", timeout=5000)
+                    if field_plan.field_type == 'select' and field_plan.tag_name == 'select':
+                        if field_plan.options is None:
+                            with self.metrics.span('field_evaluate'):
+                                field_plan.learn_options(field.evaluate(SELECT_OPTIONS_SCRIPT, timeout=5000))
+                        option_value = field_plan.options.get(value_str)
+                        if option_value is None:
+                            self.log(f"Could not select option for {element_description} by {field_plan.select_by}: {value_str}", level=logging.WARNING)
+                            raise FillFailure(FAILURE_SELECT_MISMATCH, f"No matching option for {element_id}")
+                        with self.metrics.span('field_fill'):
+                            field.select_option(value=option_value, timeout=5000)
+                        self.log(f"Selected option for {element_description}: {value_str}", level=logging.DEBUG)
+                    else:
+                        with self.metrics.span('field_fill'):
+                            field.fill(value_str, timeout=5000)
+                        self.log(f"Filled {element_description} with value: {value_str}", level=logging.DEBUG)
+                    time.sleep(self.pacer.field_wait())
+                else:
+                    self.log(f"Could not find element {element_description} ({selector})", level=logging.WARNING)
+                    raise FillFailure(FAILURE_ELEMENT_MISSING, f"Element not found: {selector}")
+            except sync_api.TimeoutError:
+                # An element that is not in the page at all will not turn up on a retry
+                if field.count() == 0:
+                    self.log(f"Could not find element {element_description} ({selector})", level=logging.WARNING)
+                    raise FillFailure(FAILURE_ELEMENT_MISSING, f"Element not found: {selector}")
+                self.log(f"Timeout waiting for or interacting with {element_description} ({selector})", level=logging.WARNING)
+                raise FillFailure(FAILURE_TIMEOUT, f"Timeout interacting with {selector}")
+            except Exception as e:
+                self.log(f"Error interacting with {element_description} ({selector}): {str(e)}", level=logging.WARNING)
+                raise
+
+
+class AsyncFormFillerEngine(FormFillerEngine):
+    # Same pipeline on playwright.async_api: the logged-in context gets one page
+    # per worker, the pages share one row feed and up to max_in_flight row fills
+    # await the browser at once, all on a single event loop thread. fill() types
+    # into whatever has focus, so per-field fills on one page take turns; only
+    # batch fills, which never move the focus, share a page.
+    def __init__(self, *args, max_in_flight=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.max_in_flight = max(1, int(max_in_flight)) if max_in_flight else None
+        self._fill_locks = {}
+
+    def fill_rows(self, rows, total_entries):
+        if self.replay:
+            # Replay posts from a thread pool; the browser only logs in and records the post
+            return super().fill_rows(rows, total_entries)
+        return asyncio.run(self.fill_rows_async(rows, total_entries))
+
+    async def fill_rows_async(self, rows, total_entries):
+        summary = {'total': total_entries, 'success': 0, 'failure': 0, 'stopped': False}
+        if self.trace_dir:
+            # Fills in flight share one context, so its trace cannot be cut per entry
+            self.log("Failure traces are not available with the asyncio engine", level=logging.WARNING)
+        pages = min(self.workers, max(1, total_entries))
+        max_in_flight = self.max_in_flight or pages
+        if not self.batch_fill and max_in_flight > pages:
+            self.log(f"Per-field fills take turns on each page; {pages} fills in flight instead of {max_in_flight} "
+                     f"(use batch fill to fill several entries per page at once)")
+            max_in_flight = pages
+
+        self.log(f"Starting automation for website: {self.website_url}")
+
+        async with async_api.async_playwright() as playwright:
+            browser = await self.open_browser_async(playwright)
+            try:
+                storage_state = self.cached_session()
+                context = await browser.new_context(storage_state=storage_state)
+                if self.blocker:
+                    await self.blocker.attach_async(context)
+                page = await context.new_page()
+
+                self.log(f"Navigating to {self.website_url}")
+                with self.metrics.span('navigate'):
+                    await page.goto(self.website_url, wait_until='networkidle')
+
+                with self.metrics.span('login'):
+                    if storage_state and await self.session_accepted_async(page):
+                        self.log("Cached login session accepted, skipping login.")
+                    else:
+                        if storage_state:
+                            self.reject_cached_session()
+                        if not await self.login_async(page):
+                            self.log("User indicated login failed. Aborting.")
+                            summary['stopped'] = True
+                            return summary
+                        self.save_session(await context.storage_state())
+
+                self.update_status(f"Starting form filling on {pages} pages, up to {max_in_flight} fills in flight...")
+                semaphore = asyncio.Semaphore(max_in_flight)
+                results = await asyncio.gather(
+                    *(self.run_page_async(context, page if page_id == 1 else None, page_id, rows, total_entries, semaphore)
+                      for page_id in range(1, pages + 1)),
+                    return_exceptions=True)
+                for result in results:
+                    if isinstance(result, Exception):
+                        self.log(f"Page failed: {str(result)}", level=logging.WARNING)
+
+                self.collect_summary(summary)
+
+                if not summary['stopped']:
+                    self.log("All entries processed!")
+                    self.update_status("Completed")
+                    if self.finish_callback:
+                        await asyncio.to_thread(self.finish_callback, summary)
+                else:
+                    self.log("Automation stopped before completion.")
+                    self.update_status("Stopped")
+
+            except Exception as browser_err:
+                self.log(f"Browser/Navigation error: {str(browser_err)}", level=logging.ERROR)
+                if self.error_callback:
+                    self.log("Browser window kept open for inspection despite error")
+                    await asyncio.to_thread(self.error_callback, browser_err)
+                raise
+
+            finally:
+                if browser.is_connected():
+                    await browser.close()
+
+        return summary
+
+    async def open_browser_async(self, playwright):
+        if self.browser_endpoint:
+            self.log(f"Attaching to browser server at {self.browser_endpoint}")
+            with self.metrics.span('browser_connect'):
+                return await playwright.chromium.connect_over_cdp(self.browser_endpoint)
+        with self.metrics.span('browser_launch'):
+            return await playwright.chromium.launch(headless=self.headless)
+
+    async def run_page_async(self, context, page, page_id, rows, total_entries, semaphore):
+        log_prefix.set(f"[page {page_id}]")
+        if page is None:
+            # Pages of one context share the login cookies
+            page = await context.new_page()
+            self.log(f"Navigating to {self.website_url}")
+            with self.metrics.span('navigate'):
+                await page.goto(self.website_url, wait_until='networkidle')
+        with self.metrics.span('iframe_discovery'):
+            frame = await self.find_form_frame_async(page)
+        in_flight = set()
+        window = FormWindow(self.window_size)
+        while not self.stop_event.is_set():
+            while not self.pause_event.is_set() and not self.stop_event.is_set():
+                await asyncio.sleep(0.5)
+            if window.full():
+                # Let the window's fills and retries finish before submitting it
+                if in_flight:
+                    await asyncio.gather(*in_flight)
+                if self.stop_event.is_set():
+                    break
+                await self.submit_window_async(frame, window, total_entries)
+            start_wait = self.pacer.row_start_wait()
+            if start_wait:
+                await asyncio.sleep(start_wait)
+            # Take a fill slot before pulling a row, so idle pages leave rows to the others
+            await semaphore.acquire()
+            next_row = next(rows, None) if not self.stop_event.is_set() else None
+            if next_row is None:
+                semaphore.release()
+                break
+            idx, row = next_row
+            task = asyncio.create_task(self.process_row_async(frame, window, window.next_slot(), idx, row,
+                                                             total_entries, semaphore))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+        if self.stop_event.is_set():
+            self.log("Automation stopped by user")
+        if in_flight:
+            await asyncio.gather(*in_flight)
+        if window.pending() and not self.stop_event.is_set():
+            await self.submit_window_async(frame, window, total_entries)
+
+    async def submit_window_async(self, frame, window, total_entries):
+        self.log(f"Submitting {len(window.filled)} entries ({window.slots} form blocks)")
+        form_url = frame.url
+        try:
+            with self.metrics.span('submit'):
+                async with frame.expect_navigation(timeout=30000):
+                    await frame.locator(SUBMIT_SELECTOR).first.click(timeout=10000)
+        except Exception as e:
+            self.log(f"Submitting the form failed: {str(e)}", level=logging.ERROR)
+            self.window_submitted(window, total_entries, e)
+            raise FormFillerError(f"Form submit failed: {str(e)}") from e
+        self.window_submitted(window, total_entries)
+        with self.metrics.span('form_reload'):
+            await frame.goto(form_url, wait_until='domcontentloaded')
+            await frame.locator(f"#{self.plan.block_ids(0)[0]}").wait_for(state="visible", timeout=20000)
+
+    async def clear_block_async(self, frame, slot):
+        try:
+            await frame.evaluate(CLEAR_BLOCK_SCRIPT, self.plan.block_ids(slot))
+        except Exception as e:
+            self.log(f"Could not clear {self.plan.block_range(slot)}: {str(e)}", level=logging.WARNING)
+
+    async def process_row_async(self, frame, window, slot, idx, row, total_entries, semaphore):
+        job = RetryJob(idx, row, slot)
+        holding = True
+        try:
+            self.log(f"Processing entry {job.idx + 1}: {dict(zip(self.columns, row))}")
+            while not self.stop_event.is_set():
+                try:
+                    started = time.monotonic()
+                    with self.metrics.span('retry' if job.attempts else 'attempt'):
+                        await self.fill_form_async(frame, row, slot)
+                except Exception as e:
+                    job.attempts += 1
+                    delay = self.attempt_failed(job, e, total_entries)
+                    await asyncio.sleep(self.pacer.attempt_failed(delay is None))
+                    if delay is None:
+                        if window.size:
+                            await self.clear_block_async(frame, slot)
+                        return
+                    # Back off without holding a fill slot, so other rows keep going
+                    semaphore.release()
+                    holding = False
+                    await self.wait_for_retry_async(delay)
+                    await semaphore.acquire()
+                    holding = True
+                    continue
+                self.log(f"Successfully filled form {job.idx + 1} ({self.plan.block_range(slot)})")
+                self.metrics.observe('row', time.perf_counter() - job.started)
+                self.row_filled(window, job, total_entries)
+                await asyncio.sleep(self.pacer.row_succeeded(time.monotonic() - started))
+                return
+        finally:
+            if holding:
+                semaphore.release()
+
+    async def settle_after_login_async(self, page):
+        if not self.pacer.adaptive:
+            await page.wait_for_timeout(5000)
+            return
+        await page.wait_for_load_state('networkidle')
+        try:
+            await page.locator(LOGGED_IN_SELECTOR).first.wait_for(state="attached", timeout=5000)
+        except sync_api.TimeoutError:
+            pass
+
+    async def session_accepted_async(self, page):
+        try:
+            await page.locator(LOGGED_IN_SELECTOR).first.wait_for(state="attached", timeout=10000)
+            return True
+        except sync_api.TimeoutError:
+            return False
+
+    async def login_async(self, page):
+        if not self.password:
+            self.log("No password provided, waiting for manual login...")
+            self.update_status("Waiting for manual login...")
+            await asyncio.to_thread(
+                self.prompt, PROMPT_MANUAL_LOGIN,
+                "Please log in to the website in the browser window. Click OK here when you are logged in and ready to proceed.")
+            self.log("User confirmed login. Waiting for page elements to load...")
+            await self.settle_after_login_async(page)
+            return True
+
+        try:
+            self.log("Password provided, attempting automatic login...")
+            await page.wait_for_load_state('networkidle')
+
+            # The password field may sit in the main document or in any iframe
+            for frame in [page.main_frame] + [f for f in page.frames if f != page.main_frame]:
+                try:
+                    pw_input = frame.locator('input[type="password"]')
+                    if await pw_input.count() == 0:
+                        continue
+                    where = "main document" if frame == page.main_frame else "iframe"
+                    self.log(f"Found password field in {where}")
+                    await pw_input.first.fill(self.password)
+                    submit_button = frame.locator('button[type="submit"], input[type="submit"]')
+                    if await submit_button.count() > 0:
+                        await submit_button.first.click()
+                        self.log(f"Submitted password form in {where}, waiting for login to complete...")
+                    else:
+                        await pw_input.first.press("Enter")
+                        self.log(f"Submit button not found in {where}, pressed Enter key instead")
+                    break
+                except Exception as frame_err:
+                    self.log(f"Error checking iframe: {frame_err}", level=logging.WARNING)
+                    continue
+
+            await page.wait_for_load_state('networkidle')
+            await self.settle_after_login_async(page)
+
+            if await page.locator(FORM_IFRAME_SELECTOR).count() > 0 or await page.locator('#element_0').count() > 0:
+                self.log("Login successful, proceeding to form filling.")
+                return True
+
+            screenshot_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "login_debug.png")
+            await page.screenshot(path=screenshot_path)
+            self.log(f"Login may have failed. Saved screenshot to {screenshot_path}", level=logging.WARNING)
+
+            confirmed = await asyncio.to_thread(
+                self.prompt, PROMPT_CONFIRM_LOGIN, "Was the login successful? Click Yes to continue, No to abort.")
+            if not confirmed:
+                self.stop_event.set()
+                return False
+            return True
+
+        except FormFillerError:
+            raise
+        except Exception as e:
+            self.log(f"Automatic login failed: {e}", level=logging.WARNING)
+            self.log("Falling back to manual login...")
+            await asyncio.to_thread(
+                self.prompt, PROMPT_MANUAL_LOGIN,
+                "Automatic login failed. Please log in manually in the browser window. Click OK when finished.")
+            self.log("User confirmed manual login. Waiting for page elements to load...")
+            await self.settle_after_login_async(page)
+            return True
+
+    async def find_form_frame_async(self, page):
+        self.log("Looking for the form iframe...")
+        try:
+            await page.locator(FORM_IFRAME_SELECTOR).wait_for(state="attached", timeout=20000)
+            frame = next((f for f in page.frames if FORM_HOST in f.url), None)
+            if not frame:
+                raise FormFillerError("Form iframe not found after login.")
+        except Exception as e:
+            self.log(f"Error: Could not find or switch to the form iframe: {e}", level=logging.ERROR)
+            self.update_status("Error: Form iframe not found.")
+            raise FormFillerError("Form iframe not found after login.")
+
+        try:
+            await frame.locator("#element_0").wait_for(state="visible", timeout=20000)
+            self.log("Initial form element found in iframe. Proceeding with form filling.")
+        except sync_api.TimeoutError:
+            self.log("Error: Initial form element (#element_0) did not become visible in iframe. Aborting.", level=logging.ERROR)
+            self.update_status("Error: Form not loaded in iframe.")
+            raise FormFillerError("Initial form element #element_0 not found in iframe after login.")
+
+        return frame
+
+    async def wait_for_retry_async(self, delay):
+        deadline = time.monotonic() + delay
+        while not self.stop_event.is_set():
+            self.renew_lease()
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            if self.job_queue:
+                remaining = min(remaining, self.job_queue.lease_seconds / 6)
+            await asyncio.sleep(remaining)
+
+    async def fill_form_batched_async(self, frame, row_data, idx):
+        fields = self.batch_fields(row_data, idx)
+        if not fields:
+            return
+        if self.pacer.adaptive:
+            selector = f"#{self.plan.last_element_id(idx)}"
+            last_field = frame.locator(selector)
+            try:
+                await last_field.wait_for(state="attached", timeout=10000)
+            except sync_api.TimeoutError:
+                if await last_field.count() == 0:
+                    self.log(f"Could not find element {selector} ending {self.plan.block_range(idx)}", level=logging.WARNING)
+                    raise FillFailure(FAILURE_ELEMENT_MISSING, f"Element not found: {selector}")
+                raise
+        with self.metrics.span('batch_evaluate'):
+            results = await frame.evaluate(BATCH_FILL_SCRIPT, [list(field[1:]) for field in fields])
+        fallback_columns = self.check_batch_results(fields, results)
+        if fallback_columns:
+            await self.fill_form_async(frame, row_data, idx, columns=fallback_columns)
+
+    async def fill_form_async(self, frame, row_data, idx, columns=None):
+        if self.batch_fill and columns is None:
+            return await self.fill_form_batched_async(frame, row_data, idx)
+        # One per-field fill per page at a time, or text lands in another row's focused field
+        async with self._fill_locks.setdefault(frame, asyncio.Lock()):
+            await self.fill_fields_async(frame, row_data, idx, columns)
+
+    async def fill_fields_async(self, frame, row_data, idx, columns=None):
+        for field_plan, element_id, value_str in self.plan.block(row_data, idx):
+            if columns is not None and field_plan.column not in columns:
+                continue
+            selector = field_plan.selector(element_id)
+            element_description = f"field {field_plan.column+1} ({element_id})"
+            try:
+                field = frame.locator(selector)
+                with self.metrics.span('field_wait'):
+                    await field.wait_for(state="visible", timeout=10000)
+                    found = await field.count() > 0
+                if not found:
+                    self.log(f"Could not find element {element_description} ({selector})", level=logging.WARNING)
+                    raise FillFailure(FAILURE_ELEMENT_MISSING, f"Element not found: {selector}")
+                if field_plan.tag_name is None:
+                    with self.metrics.span('field_evaluate'):
+                        field_plan.tag_name = await field.evaluate("(element) => element.tagName.toLowerCase()", timeout=5000)
+                if field_plan.field_type == 'select' and field_plan.tag_name == 'select':
+                    if field_plan.options is None:
+                        with self.metrics.span('field_evaluate'):
+                            field_plan.learn_options(await field.evaluate(SELECT_OPTIONS_SCRIPT, timeout=5000))
+                    option_value = field_plan.options.get(value_str)
+                    if option_value is None:
+                        self.log(f"Could not select option for {element_description} by {field_plan.select_by}: {value_str}", level=logging.WARNING)
+                        raise FillFailure(FAILURE_SELECT_MISMATCH, f"No matching option for {element_id}")
+                    with self.metrics.span('field_fill'):
+                        await field.select_option(value=option_value, timeout=5000)
+                    self.log(f"Selected option for {element_description}: {value_str}", level=logging.DEBUG)
+                else:
+                    with self.metrics.span('field_fill'):
+                        await field.fill(value_str, timeout=5000)
+                    self.log(f"Filled {element_description} with value: {value_str}", level=logging.DEBUG)
+                await asyncio.sleep(self.pacer.field_wait())
+            except sync_api.TimeoutError:
+                # An element that is not in the page at all will not turn up on a retry
+                if await field.count() == 0:
+                    self.log(f"Could not find element {element_description} ({selector})", level=logging.WARNING)
+                    raise FillFailure(FAILURE_ELEMENT_MISSING, f"Element not found: {selector}")
+                self.log(f"Timeout waiting for or interacting with {element_description} ({selector})", level=logging.WARNING)
+                raise FillFailure(FAILURE_TIMEOUT, f"Timeout interacting with {selector}")
+            except Exception as e:
+                self.log(f"Error interacting with {element_description} ({selector}): {str(e)}", level=logging.WARNING)
+                raise
+
 
 class FormFillerApp:
     def __init__(self, root):
         self.root = root
         self.root.title("Web Form Filler")
-        self.root.geometry("650x450")
+        self.root.geometry("650x950")
         self.root.resizable(True, True)
         
         self.file_path = tk.StringVar()
@@ -35,13 +3089,37 @@ class FormFillerApp:
         self.file_type = tk.StringVar(value="csv")
         self.max_entries_to_process = tk.IntVar(value=0) # 0 means process all
         self.web_password = tk.StringVar()
+        self.headless = tk.BooleanVar(value=False)
+        self.browser_endpoint = tk.StringVar()
+        self.workers = tk.IntVar(value=1)
+        self.use_async = tk.BooleanVar(value=False)
+        self.max_in_flight = tk.IntVar(value=0)
+        self.batch_fill = tk.BooleanVar(value=False)
+        self.resume = tk.BooleanVar(value=False)
+        self.requeue_failed = tk.BooleanVar(value=False)
+        self.session_cache = tk.BooleanVar(value=True)
+        self.adaptive_pacing = tk.BooleanVar(value=False)
+        self.target_rpm = tk.IntVar(value=0)
+        self.log_level = tk.StringVar(value="entry")
+        self.mapping_file = tk.StringVar()
+        self.preflight = tk.StringVar(value="quarantine")
+        self.dedupe = tk.BooleanVar(value=False)
+        self.replay = tk.BooleanVar(value=False)
+        self.trace_failures = tk.BooleanVar(value=False)
+        self.lookahead = tk.IntVar(value=0)
+        self.window_size = tk.IntVar(value=0)
+        self.block_resources = tk.BooleanVar(value=False)
+        self.log_line_count = 0
         
+        # Engine threads never touch widgets; they post here and the Tk loop drains it
+        self.ui_queue = queue.Queue()
         self.automation_thread = None
         self.stop_event = Event()
         self.pause_event = Event()
         self.pause_event.set()  # Not paused initially
         
         self.setup_ui()
+        self.process_ui_queue()
     
     def setup_ui(self):
         # Main frame
@@ -49,12 +3127,19 @@ class FormFillerApp:
         main_frame.pack(fill=tk.BOTH, expand=True)
         
         # File selection
-        file_frame = ttk.LabelFrame(main_frame, text="Data File (CSV Only)", padding="10")
+        file_frame = ttk.LabelFrame(main_frame, text="Data File (CSV, Parquet, Arrow or JSONL)", padding="10")
         file_frame.pack(fill=tk.X, padx=5, pady=5)
         
         ttk.Entry(file_frame, textvariable=self.file_path, width=50).pack(side=tk.LEFT, padx=5)
         ttk.Button(file_frame, text="Browse", command=self.browse_file).pack(side=tk.LEFT, padx=5)
         
+        # Form mapping (optional, the built-in layout is used when empty)
+        mapping_frame = ttk.LabelFrame(main_frame, text="Form Mapping (optional JSON)", padding="10")
+        mapping_frame.pack(fill=tk.X, padx=5, pady=5)
+        
+        ttk.Entry(mapping_frame, textvariable=self.mapping_file, width=50).pack(side=tk.LEFT, padx=5)
+        ttk.Button(mapping_frame, text="Browse", command=self.browse_mapping).pack(side=tk.LEFT, padx=5)
+        
         # Website URL
         url_frame = ttk.LabelFrame(main_frame, text="Website URL", padding="10")
         url_frame.pack(fill=tk.X, padx=5, pady=5)
@@ -85,6 +3170,42 @@ class FormFillerApp:
         ttk.Spinbox(settings_frame, from_=0, to=99999, textvariable=self.max_entries_to_process, width=7).grid(row=3, column=1, sticky=tk.W, padx=5, pady=2)
         # --- End New Entry ---
 
+        ttk.Label(settings_frame, text="Parallel workers (browser contexts):").grid(row=4, column=0, sticky=tk.W, padx=5, pady=2)
+        ttk.Spinbox(settings_frame, from_=1, to=32, textvariable=self.workers, width=5).grid(row=4, column=1, sticky=tk.W, padx=5, pady=2)
+
+        ttk.Label(settings_frame, text="Fills in flight (asyncio engine, 0 for one per page):").grid(row=5, column=0, sticky=tk.W, padx=5, pady=2)
+        ttk.Spinbox(settings_frame, from_=0, to=64, textvariable=self.max_in_flight, width=5).grid(row=5, column=1, sticky=tk.W, padx=5, pady=2)
+
+        ttk.Checkbutton(settings_frame, text="Run browser headless (no window)", variable=self.headless).grid(row=6, column=0, sticky=tk.W, padx=5, pady=2)
+        ttk.Checkbutton(settings_frame, text="Use asyncio engine", variable=self.use_async).grid(row=6, column=1, sticky=tk.W, padx=5, pady=2)
+        ttk.Checkbutton(settings_frame, text="Fill each form block in one call", variable=self.batch_fill).grid(row=7, column=0, sticky=tk.W, padx=5, pady=2)
+        ttk.Checkbutton(settings_frame, text="Block images, fonts and trackers", variable=self.block_resources).grid(row=7, column=1, sticky=tk.W, padx=5, pady=2)
+        ttk.Checkbutton(settings_frame, text="Resume from last checkpoint", variable=self.resume).grid(row=8, column=0, sticky=tk.W, padx=5, pady=2)
+        ttk.Checkbutton(settings_frame, text="Retry failed entries on resume", variable=self.requeue_failed).grid(row=8, column=1, sticky=tk.W, padx=5, pady=2)
+        ttk.Checkbutton(settings_frame, text="Reuse saved login session", variable=self.session_cache).grid(row=9, column=0, sticky=tk.W, padx=5, pady=2)
+        ttk.Checkbutton(settings_frame, text="Adaptive pacing (ignore fixed delays)", variable=self.adaptive_pacing).grid(row=9, column=1, sticky=tk.W, padx=5, pady=2)
+
+        ttk.Label(settings_frame, text="Max rows per minute (0 for no limit):").grid(row=10, column=0, sticky=tk.W, padx=5, pady=2)
+        ttk.Spinbox(settings_frame, from_=0, to=10000, textvariable=self.target_rpm, width=7).grid(row=10, column=1, sticky=tk.W, padx=5, pady=2)
+
+        ttk.Label(settings_frame, text="Log detail:").grid(row=11, column=0, sticky=tk.W, padx=5, pady=2)
+        ttk.Combobox(settings_frame, textvariable=self.log_level, values=list(LOG_LEVELS), state="readonly", width=7).grid(row=11, column=1, sticky=tk.W, padx=5, pady=2)
+
+        ttk.Label(settings_frame, text="Rows failing pre-flight checks:").grid(row=12, column=0, sticky=tk.W, padx=5, pady=2)
+        ttk.Combobox(settings_frame, textvariable=self.preflight, values=list(PREFLIGHT_MODES), state="readonly", width=10).grid(row=12, column=1, sticky=tk.W, padx=5, pady=2)
+        ttk.Checkbutton(settings_frame, text="Skip entries submitted in earlier runs", variable=self.dedupe).grid(row=13, column=0, sticky=tk.W, padx=5, pady=2)
+        ttk.Checkbutton(settings_frame, text="Post entries over HTTP (replay)", variable=self.replay).grid(row=13, column=1, sticky=tk.W, padx=5, pady=2)
+
+        ttk.Label(settings_frame, text="Submit form every N entries (0 = never):").grid(row=14, column=0, sticky=tk.W, padx=5, pady=2)
+        ttk.Spinbox(settings_frame, from_=0, to=10000, textvariable=self.window_size, width=7).grid(row=14, column=1, sticky=tk.W, padx=5, pady=2)
+
+        ttk.Label(settings_frame, text="Browser server (empty to launch Chromium):").grid(row=15, column=0, sticky=tk.W, padx=5, pady=2)
+        ttk.Entry(settings_frame, textvariable=self.browser_endpoint, width=25).grid(row=15, column=1, sticky=tk.W, padx=5, pady=2)
+        ttk.Checkbutton(settings_frame, text="Save traces of failed entries", variable=self.trace_failures).grid(row=16, column=0, sticky=tk.W, padx=5, pady=2)
+
+        ttk.Label(settings_frame, text="Form blocks prepared ahead (0 = off):").grid(row=17, column=0, sticky=tk.W, padx=5, pady=2)
+        ttk.Spinbox(settings_frame, from_=0, to=20, textvariable=self.lookahead, width=5).grid(row=17, column=1, sticky=tk.W, padx=5, pady=2)
+
         # Progress frame
         progress_frame = ttk.LabelFrame(main_frame, text="Progress", padding="10")
         progress_frame.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
@@ -92,6 +3213,9 @@ class FormFillerApp:
         self.progress_bar = ttk.Progressbar(progress_frame, orient="horizontal", length=100, mode="determinate")
         self.progress_bar.pack(fill=tk.X, padx=5, pady=5)
         
+        self.rate_label = ttk.Label(progress_frame, text="")
+        self.rate_label.pack(padx=5)
+        
         self.status_label = ttk.Label(progress_frame, text="Ready")
         self.status_label.pack(padx=5, pady=5)
         
@@ -114,22 +3238,92 @@ class FormFillerApp:
         self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
     
     def browse_file(self):
-        filetypes = [("CSV files", "*.csv"), ("All files", "*.*")]
+        filetypes = [("Data files", "*.csv *.parquet *.pq *.arrow *.feather *.ipc *.jsonl *.ndjson"),
+                     ("CSV files", "*.csv"), ("Parquet files", "*.parquet *.pq"),
+                     ("Arrow IPC files", "*.arrow *.feather *.ipc"), ("JSON Lines files", "*.jsonl *.ndjson"),
+                     ("All files", "*.*")]
             
         file_path = filedialog.askopenfilename(filetypes=filetypes)
         if file_path:
             self.file_path.set(file_path)
-            self.file_type.set("csv")
+            self.file_type.set(file_type_for(file_path))
+
+    def browse_mapping(self):
+        file_path = filedialog.askopenfilename(filetypes=[("JSON files", "*.json"), ("All files", "*.*")])
+        if file_path:
+            self.mapping_file.set(file_path)
 
     def log_message(self, message):
+        self.append_log(message)
+        logger.info(message)
+
+    def append_log(self, message):
+        # Widget-only logging; the engine already writes to form_filler.log
+        self.append_log_lines([f"{datetime.now().strftime('%H:%M:%S')} - {message}"])
+
+    def append_log_lines(self, lines):
+        # One widget update per batch; only the last MAX_LOG_LINES lines are kept
         self.progress_text.configure(state="normal")
-        self.progress_text.insert(tk.END, f"{datetime.now().strftime('%H:%M:%S')} - {message}\n")
+        self.progress_text.insert(tk.END, "\n".join(lines) + "\n")
+        self.log_line_count += len(lines)
+        overflow = self.log_line_count - MAX_LOG_LINES
+        if overflow > 0:
+            self.progress_text.delete("1.0", f"{overflow + 1}.0")
+            self.log_line_count -= overflow
         self.progress_text.see(tk.END)
         self.progress_text.configure(state="disabled")
-        logger.info(message)
     
     def update_status(self, message):
         self.status_label.config(text=message)
+
+    def update_progress(self, value, maximum, readout=""):
+        self.progress_bar["maximum"] = maximum
+        self.progress_bar["value"] = value
+        self.rate_label.config(text=readout)
+
+    def post_ui(self, kind, *args):
+        # Thread-safe; may be called from any engine thread or the asyncio loop
+        self.ui_queue.put((kind, args))
+
+    def post_log(self, message):
+        # Timestamp when the engine logged it, not when the GUI gets to it
+        self.post_ui('log', f"{datetime.now().strftime('%H:%M:%S')} - {message}")
+
+    def process_ui_queue(self):
+        # Drains a batch per tick; only the latest status and progress are drawn
+        lines = []
+        latest = {}
+        try:
+            for _ in range(UI_QUEUE_BATCH):
+                kind, args = self.ui_queue.get_nowait()
+                if kind == 'log':
+                    lines.append(args[0])
+                else:
+                    latest[kind] = args
+        except queue.Empty:
+            pass
+        if lines:
+            self.append_log_lines(lines)
+        if 'status' in latest:
+            self.update_status(*latest['status'])
+        if 'progress' in latest:
+            self.update_progress(*latest['progress'])
+        self.root.after(100, self.process_ui_queue)
+
+    def call_in_ui(self, func):
+        # Runs func on the Tk thread and blocks the calling thread until it returns
+        done = Event()
+        result = {}
+
+        def run():
+            try:
+                result['value'] = func()
+            finally:
+                done.set()
+
+        self.root.after(0, run)
+        done.wait()
+        return result.get('value')
     
     def start_automation(self):
         if not self.file_path.get():
@@ -150,6 +3344,7 @@ class FormFillerApp:
         self.progress_text.configure(state="normal")
         self.progress_text.delete(1.0, tk.END)
         self.progress_text.configure(state="disabled")
+        self.log_line_count = 0
         
         self.automation_thread = Thread(target=self.run_automation)
         self.automation_thread.daemon = True
@@ -179,397 +3374,113 @@ class FormFillerApp:
         else:
             self.root.destroy()
     
-    def load_data(self):
-        file_path = self.file_path.get()
-        file_type = "csv"
-        
-        try:
-            if file_type == "csv":
-                with open(file_path, 'r', newline='') as f:
-                    sample = f.read(8192)
-                
-                try:
-                    dialect = csv.Sniffer().sniff(sample)
-                    delimiter = dialect.delimiter
-                    self.log_message(f"Detected CSV delimiter: '{delimiter}'")
-                except csv.Error:
-                    self.log_message("Could not detect CSV delimiter, assuming comma ','")
-                    delimiter = ','
-
-                df = pd.read_csv(file_path, delimiter=delimiter, header=None)
-                
-                headers = ['first_name', 'last_name', 'gender', 'age', 'id']
-                if len(df.columns) != len(headers):
-                    headers = [f'col_{i}' for i in range(len(df.columns))]
-                df.columns = headers
-                
-            return df
-        
-        except Exception as e:
-            self.log_message(f"Error loading data file: {str(e)}")
-            raise
+    def create_engine(self):
+        engine_class = AsyncFormFillerEngine if self.use_async.get() else FormFillerEngine
+        options = {'max_in_flight': self.max_in_flight.get() or None} if self.use_async.get() else {}
+        return engine_class(
+            file_path=self.file_path.get(),
+            file_type=file_type_for(self.file_path.get()),
+            website_url=self.website_url.get(),
+            password=self.web_password.get(),
+            delay_time=self.delay_time.get(),
+            between_forms_delay=self.between_forms_delay.get(),
+            max_retries=self.max_retries.get(),
+            max_entries_to_process=self.max_entries_to_process.get(),
+            headless=self.headless.get(),
+            browser_endpoint=self.browser_endpoint.get().strip() or None,
+            workers=self.workers.get(),
+            batch_fill=self.batch_fill.get(),
+            resume=self.resume.get(),
+            requeue_failed=self.requeue_failed.get(),
+            session_cache=self.session_cache.get(),
+            adaptive_pacing=self.adaptive_pacing.get(),
+            target_rpm=self.target_rpm.get(),
+            log_level=self.log_level.get(),
+            mapping_file=self.mapping_file.get() or None,
+            block_profile='default' if self.block_resources.get() else 'off',
+            preflight=self.preflight.get(),
+            dedupe=self.dedupe.get(),
+            replay=self.replay.get(),
+            trace_dir=f"{self.file_path.get()}.traces" if self.trace_failures.get() else None,
+            lookahead=self.lookahead.get(),
+            window_size=self.window_size.get(),
+            log_callback=self.post_log,
+            status_callback=partial(self.post_ui, 'status'),
+            progress_callback=partial(self.post_ui, 'progress'),
+            prompt_callback=self.prompt_user,
+            finish_callback=self.show_completion,
+            error_callback=self.show_browser_error,
+            stop_event=self.stop_event,
+            pause_event=self.pause_event,
+            **options
+        )
     
     def run_automation(self):
         try:
-            self.update_status("Loading data file...")
-            self.log_message(f"Loading data from {self.file_path.get()}")
-            
-            try:
-                df_full = self.load_data() # Load the full dataframe first
-                total_loaded = len(df_full)
-                self.log_message(f"Loaded {total_loaded} total entries from file")
-
-                # --- Limit number of entries based on user input ---
-                num_to_process = self.max_entries_to_process.get()
-                if num_to_process > 0 and num_to_process < total_loaded:
-                    df = df_full.head(num_to_process)
-                    total_entries = num_to_process
-                    self.log_message(f"Processing the first {total_entries} entries as requested.")
-                else:
-                    df = df_full # Process all
-                    total_entries = total_loaded
-                    if num_to_process > 0:
-                         self.log_message(f"Requested number ({num_to_process}) is >= total entries ({total_loaded}). Processing all.")
-                    else:
-                         self.log_message("Processing all entries.")
-                # --- End limiting entries ---
+            self.create_engine().run()
+        except Exception as e:
+            logger.error(f"Automation error: {str(e)}")
+            self.post_log(f"Automation error: {str(e)}")
+            # Browser errors were already reported while the browser was still open
+            if not getattr(e, "reported", False):
+                # e is unbound once this block ends; the callback runs later on the Tk thread
+                message = f"An error occurred: {str(e)}"
+                self.root.after(0, lambda: messagebox.showerror("Error", message))
+        finally:
+            self.root.after(0, self.reset_ui)
+    
+    def prompt_user(self, kind, message):
+        # Called from the automation thread; shows the dialog on the Tk thread and waits for it
+        if kind == PROMPT_CONFIRM_LOGIN:
+            return self.call_in_ui(lambda: messagebox.askyesno("Login Check", message))
+        self.call_in_ui(lambda: messagebox.showinfo("Manual Login Required", message))
+        return True
 
+    def show_browser_error(self, error):
+        # Blocks the automation thread so the browser stays open until the dialog is dismissed
+        self.call_in_ui(lambda: messagebox.showerror("Error", f"An error occurred with the browser: {str(error)}"))
+        error.reported = True
 
-                column_names = ', '.join(df.columns.tolist())
-                self.log_message(f"Columns being processed: {column_names}")
+    def show_completion(self, summary):
+        if self.headless.get():
+            self.root.after(0, lambda: messagebox.showinfo(
+                "Complete", f"Form filling completed.\nSuccessful: {summary['success']}\nFailed: {summary['failure']}"))
+            return
 
-            except Exception as e:
-                self.log_message(f"Error loading data file: {str(e)}")
-                messagebox.showerror("Error", f"Failed to load data file: {str(e)}")
-                self.reset_ui()
-                return
+        self.post_ui('status', "Completed - Browser remains open")
 
-            self.progress_bar["maximum"] = total_entries # Use the potentially reduced count
-            self.progress_bar["value"] = 0
-            
-            self.log_message(f"Starting automation for website: {self.website_url.get()}")
-            
-            with sync_playwright() as playwright:
-                browser = None
-                try:
-                    browser = playwright.chromium.launch(headless=False)
-                    context = browser.new_context()
-                    page = context.new_page()
-                    
-                    self.log_message(f"Navigating to {self.website_url.get()}")
-                    page.goto(self.website_url.get(), wait_until='networkidle') # Wait for network idle on initial load
-                    
-                    if self.web_password.get():
-                        try:
-                            self.log_message("Password provided, attempting automatic login...")
-                            
-                            # Wait for page to load completely
-                            page.wait_for_load_state('networkidle')
-                            
-                            # First attempt - look for password field directly in main document
-                            pw_field_exists = page.locator('input[type="password"]').count() > 0
-                            
-                            if pw_field_exists:
-                                # Password field found directly on page
-                                self.log_message("Found password field in main document")
-                                pw_input = page.locator('input[type="password"]').first
-                                pw_input.fill(self.web_password.get())
-                                
-                                # Find the nearest form or submit button
-                                submit_button = page.locator('button[type="submit"], input[type="submit"]').first
-                                if submit_button:
-                                    submit_button.click()
-                                    self.log_message("Submitted password form, waiting for login to complete...")
-                                else:
-                                    # Try to submit using Enter key if no submit button found
-                                    pw_input.press("Enter")
-                                    self.log_message("Submit button not found, pressed Enter key instead")
-                            else:
-                                # Check for iframes
-                                self.log_message("Password field not found in main document, checking iframes...")
-                                frames = page.frames
-                                self.log_message(f"Found {len(frames)} frames in the page")
-                                
-                                for frame in frames:
-                                    try:
-                                        # Check if this frame has a password field
-                                        if frame.locator('input[type="password"]').count() > 0:
-                                            self.log_message(f"Found password field in iframe")
-                                            frame.locator('input[type="password"]').first.fill(self.web_password.get())
-                                            
-                                            # Try to find a submit button
-                                            if frame.locator('button[type="submit"], input[type="submit"]').count() > 0:
-                                                frame.locator('button[type="submit"], input[type="submit"]').first.click()
-                                                self.log_message("Submitted password form in iframe, waiting for login to complete...")
-                                                break
-                                            else:
-                                                # Try to submit using Enter key if no submit button found
-                                                frame.locator('input[type="password"]').first.press("Enter")
-                                                self.log_message("Submit button not found in iframe, pressed Enter key instead")
-                                                break
-                                    except Exception as frame_err:
-                                        self.log_message(f"Error checking iframe: {frame_err}")
-                                        continue
-                            
-                            # Wait for login to complete - look for content that indicates success
-                            page.wait_for_load_state('networkidle')
-                            page.wait_for_timeout(5000)  # Give it 5 seconds to settle
-                            
-                            # Check for successful login by looking for the form iframe
-                            if page.locator('iframe[src*="emailmeform.com"]').count() > 0 or page.locator('#element_0').count() > 0:
-                                self.log_message("Login successful, proceeding to form filling.")
-                            else:
-                                # Take a screenshot for debugging
-                                screenshot_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "login_debug.png")
-                                page.screenshot(path=screenshot_path)
-                                self.log_message(f"Login may have failed. Saved screenshot to {screenshot_path}")
-                                
-                                # Ask user to confirm if login was successful
-                                login_confirmed = Event()
-                                def ask_login_confirmation():
-                                    result = messagebox.askyesno("Login Check", 
-                                                                "Was the login successful? Click Yes to continue, No to abort.")
-                                    if result:
-                                        login_confirmed.set()
-                                    else:
-                                        self.stop_event.set()
-                                self.root.after(0, ask_login_confirmation)
-                                login_confirmed.wait()
-                                
-                                if self.stop_event.is_set():
-                                    self.log_message("User indicated login failed. Aborting.")
-                                    self.reset_ui()
-                                    return
-                        
-                        except Exception as e:
-                            self.log_message(f"Automatic login failed: {e}")
-                            
-                            # Fall back to manual login
-                            self.log_message("Falling back to manual login...")
-                            login_confirmed = Event()
-                            def show_login_prompt():
-                                messagebox.showinfo("Manual Login Required",
-                                                  "Automatic login failed. Please log in manually in the browser window. Click OK when finished.")
-                                login_confirmed.set()
-                            self.root.after(0, show_login_prompt)
-                            login_confirmed.wait()
-                            
-                            self.log_message("User confirmed manual login. Adding a longer wait (5s) for page elements to load...")
-                            page.wait_for_timeout(5000)
-                    else:
-                        self.log_message("No password provided, waiting for manual login...")
-                        self.update_status("Waiting for manual login...")
-                        login_confirmed = Event()
-                        def show_login_prompt():
-                            messagebox.showinfo("Manual Login Required",
-                                "Please log in to the website in the browser window. Click OK here when you are logged in and ready to proceed.")
-                            login_confirmed.set()
-                        self.root.after(0, show_login_prompt)
-                        login_confirmed.wait()
-                        self.log_message("User confirmed login. Adding a longer wait (5s) for page elements to load...")
-                        page.wait_for_timeout(5000)
-
-                    self.log_message("Looking for the form iframe...")
-                    try:
-                        # Wait for the iframe to appear
-                        iframe_locator = page.locator('iframe[src*="emailmeform.com"]')
-                        iframe_locator.wait_for(state="attached", timeout=20000)
-                        self.log_message("Form iframe found. Switching context.")
-                        # Get the frame object
-                        frame = None
-                        for f in page.frames:
-                            if "emailmeform.com" in f.url:
-                                frame = f
-                                break
-                        if not frame:
-                            raise Exception("Form iframe not found after login.")
-                    except Exception as e:
-                        self.log_message(f"Error: Could not find or switch to the form iframe: {e}")
-                        self.update_status("Error: Form iframe not found.")
-                        raise Exception("Form iframe not found after login.")
-
-                    # Now check for #element_0 inside the iframe
-                    try:
-                        self.log_message("Checking if the initial form element (#element_0) is present in the iframe...")
-                        frame.locator("#element_0").wait_for(state="visible", timeout=20000)
-                        self.log_message("Initial form element found in iframe. Proceeding with form filling.")
-                    except PlaywrightTimeoutError:
-                        self.log_message("Error: Initial form element (#element_0) did not become visible in iframe. Aborting.")
-                        self.update_status("Error: Form not loaded in iframe.")
-                        raise Exception("Initial form element #element_0 not found in iframe after login.")
+        # Create a persistent flag to prevent browser from closing
+        keep_browser_open = Event()
 
-                    self.update_status("Starting form filling...")
+        def show_window():
+            messagebox.showinfo("Complete", f"Form filling completed.\nSuccessful: {summary['success']}\nFailed: {summary['failure']}\n\nThe browser will remain open until you click Close Browser.")
+            # Create a new window with a "Close Browser" button
+            browser_window = tk.Toplevel(self.root)
+            browser_window.title("Browser Control")
+            browser_window.geometry("300x100")
+            browser_window.resizable(False, False)
 
-                    success_count = 0
-                    failure_count = 0
+            message = ttk.Label(browser_window, text="Browser window is kept open.\nClick 'Close Browser' when done.")
+            message.pack(pady=10)
 
-                    for idx, row in df.iterrows(): # Pass idx to fill_form
-                        if self.stop_event.is_set():
-                            self.log_message("Automation stopped by user")
-                            break
-                        
-                        while not self.pause_event.is_set() and not self.stop_event.is_set():
-                            time.sleep(0.5)
-                        
-                        if self.stop_event.is_set():
-                            continue
-                        
-                        entry_num = idx + 1
-                        self.update_status(f"Processing entry {entry_num} of {total_entries}")
-                        entry_dict = row.to_dict()
-                        self.log_message(f"Processing entry {entry_num}: {entry_dict}")
-                        
-                        retries = 0
-                        success = False
-                        
-                        while retries < self.max_retries.get() and not success:
-                            try:
-                                # Pass the index (idx) to fill_form
-                                self.fill_form(frame, row, idx) # pass frame instead of page
+            def close_browser_and_window():
+                # The engine closes the browser on its own thread once released
+                browser_window.destroy()
+                keep_browser_open.set()
+                self.log_message("Browser closed by user.")
 
-                                self.log_message(f"Successfully filled form {entry_num} (elements {idx*5}-{idx*5+4})") # Updated log
-                                success = True
-                                success_count += 1
+            close_button = ttk.Button(browser_window, text="Close Browser", command=close_browser_and_window)
+            close_button.pack(pady=10)
 
-                                delay = self.between_forms_delay.get()
-                                if entry_num < total_entries:
-                                    self.log_message(f"Waiting {delay} seconds before processing next entry")
-                                    time.sleep(delay)
+            # Make sure the window stays on top
+            browser_window.transient(self.root)
+            browser_window.grab_set()
 
-                            except Exception as e:
-                                retries += 1
-                                self.log_message(f"Error processing entry {entry_num} (elements {idx*5}-{idx*5+4}): {str(e)}, retry {retries}") # Updated log
-                                if retries >= self.max_retries.get():
-                                    self.log_message(f"Failed to process entry {entry_num} after {retries} attempts")
-                                    failure_count += 1
-                                    # Optional: Add a small delay before retrying the same form block
-                                    time.sleep(1)
-                                else:
-                                     # Optional: Add a small delay before retrying the same form block
-                                     time.sleep(0.5)
-
-
-                        self.progress_bar["value"] = entry_num
-                        self.root.update_idletasks()
-                
-                    # Replace the completion message and keep browser open:
-                    if not self.stop_event.is_set():
-                        self.log_message("All entries processed!")
-                        self.update_status("Completed - Browser remains open")
-                        
-                        # Create a persistent flag to prevent browser from closing
-                        keep_browser_open = Event()
-                        
-                        def show_completion():
-                            nonlocal keep_browser_open
-                            messagebox.showinfo("Complete", f"Form filling completed.\nSuccessful: {success_count}\nFailed: {failure_count}\n\nThe browser will remain open until you click Close Browser.")
-                            # Create a new window with a "Close Browser" button
-                            browser_window = tk.Toplevel(self.root)
-                            browser_window.title("Browser Control")
-                            browser_window.geometry("300x100")
-                            browser_window.resizable(False, False)
-                            
-                            message = ttk.Label(browser_window, text="Browser window is kept open.\nClick 'Close Browser' when done.")
-                            message.pack(pady=10)
-                            
-                            def close_browser_and_window():
-                                try:
-                                    if browser and browser.is_connected():
-                                        browser.close()
-                                        self.log_message("Browser closed by user.")
-                                    browser_window.destroy()
-                                    keep_browser_open.set()
-                                except Exception as e:
-                                    self.log_message(f"Error closing browser: {e}")
-                                    browser_window.destroy()
-                                    keep_browser_open.set()
-                            
-                            close_button = ttk.Button(browser_window, text="Close Browser", command=close_browser_and_window)
-                            close_button.pack(pady=10)
-                            
-                            # Make sure the window stays on top
-                            browser_window.transient(self.root)
-                            browser_window.grab_set()
-                        
-                        # Show completion message in main thread
-                        self.root.after(0, show_completion)
-                        
-                        # This will block until the user closes the browser
-                        keep_browser_open.wait()
-                    else:
-                        self.log_message("Automation stopped before completion.")
-                        self.update_status("Stopped")
-        
-                except Exception as browser_err:
-                    self.log_message(f"Browser/Navigation error: {str(browser_err)}")
-                    messagebox.showerror("Error", f"An error occurred with the browser: {str(browser_err)}")
-                    self.log_message("Browser window kept open for inspection despite error")
-                    self.reset_ui()
-                    return
-        
-        except Exception as e:
-            self.log_message(f"Automation error: {str(e)}")
-            messagebox.showerror("Error", f"An error occurred: {str(e)}")
-            self.log_message("Browser window kept open for inspection despite error")
-            self.reset_ui()
-        finally:
-            if self.stop_event.is_set():
-                 self.reset_ui()
-            elif 'e' not in locals() and not self.stop_event.is_set():
-                 self.start_button.config(state="disabled")
-                 self.pause_button.config(state="disabled", text="Pause")
-                 self.stop_button.config(state="disabled")
-    
-    def fill_form(self, frame, row_data, idx):
-        # Each form block: 5 fields (element_{base} to element_{base+4}), then h3 (element_{base+5})
-        base_index = idx * 6
-        field_details = {
-            0: (0, 'text'),    # First Name  -> element_{base+0}
-            1: (1, 'text'),    # Last Name   -> element_{base+1}
-            2: (2, 'select'),  # Gender      -> element_{base+2}
-            3: (3, 'text'),    # Age         -> element_{base+3}
-            4: (4, 'text')     # ID/Phone    -> element_{base+4}
-        }
-        for col_index, value in enumerate(row_data):
-            if col_index in field_details and not pd.isna(value):
-                offset, field_type = field_details[col_index]
-                element_id = f"element_{base_index + offset}"
-                selector = f"input#{element_id}, select#{element_id}, textarea#{element_id}"
-                value_str = str(value).strip()
-                element_description = f"field {col_index+1} ({element_id})"
-                try:
-                    self.log_message(f"Attempting to locate {element_description} with selector: {selector}")
-                    field = frame.locator(selector)
-                    field.wait_for(state="visible", timeout=10000)
-                    if field.count() > 0:
-                        tag_name = field.evaluate("(element) => element.tagName.toLowerCase()", timeout=5000)
-                        if field_type == 'select' and tag_name == 'select':
-                            try:
-                                field.select_option(value=value_str, timeout=5000)
-                                self.log_message(f"Selected option by value for {element_description}: {value_str}")
-                            except PlaywrightTimeoutError:
-                                try:
-                                    field.select_option(label=value_str, timeout=5000)
-                                    self.log_message(f"Selected option by label for {element_description}: {value_str}")
-                                except PlaywrightTimeoutError:
-                                    self.log_message(f"Could not select option for {element_description} by value or label. Trying to fill.")
-                                    field.fill(value_str, timeout=5000)
-                                except Exception as select_err:
-                                    self.log_message(f"Specific error selecting option for {element_description}: {select_err}")
-                                    raise
-                        else:
-                            field.fill(value_str, timeout=5000)
-                            self.log_message(f"Filled {element_description} with value: {value_str}")
-                        time.sleep(self.delay_time.get())
-                    else:
-                        self.log_message(f"Could not find element {element_description} ({selector})")
-                        raise Exception(f"Element not found: {selector}")
-                except PlaywrightTimeoutError:
-                    self.log_message(f"Timeout waiting for or interacting with {element_description} ({selector})")
-                    raise Exception(f"Timeout interacting with {selector}")
-                except Exception as e:
-                    self.log_message(f"Error interacting with {element_description} ({selector}): {str(e)}")
-                    raise
+        # Show completion message in main thread
+        self.root.after(0, show_window)
+
+        # This will block until the user closes the browser
+        keep_browser_open.wait()
 
     def reset_ui(self):
         self.start_button.config(state="normal")
@@ -578,7 +3489,331 @@ class FormFillerApp:
         self.pause_event.set()
         self.update_status("Ready")
 
-if __name__ == "__main__":
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Fill web forms from a data file.")
+    subparsers = parser.add_subparsers(dest="command")
+
+    subparsers.add_parser("gui", help="Launch the graphical interface (default)")
+
+    run_parser = subparsers.add_parser("run", help="Run the automation without the GUI")
+    source_group = run_parser.add_mutually_exclusive_group(required=True)
+    source_group.add_argument("--csv", "--data", dest="file_path",
+                              help="Data file to read rows from (CSV, Parquet, Arrow IPC or JSONL)")
+    source_group.add_argument("--queue", metavar="FILE",
+                              help="Claim rows from a job queue filled by `queue load` instead of reading a data file")
+    run_parser.add_argument("--file-type", choices=sorted(set(FILE_TYPES.values())),
+                            help="Data file format (default: from the file extension)")
+    run_parser.add_argument("--url", required=True, help="Website URL hosting the form")
+    run_parser.add_argument("--password", default=os.environ.get("FORM_FILLER_PASSWORD", ""),
+                            help="Login password (defaults to $FORM_FILLER_PASSWORD)")
+    run_parser.add_argument("--headless", action="store_true", help="Run Chromium without a window")
+    run_parser.add_argument("--browser-endpoint", metavar="URL",
+                            help="Attach to a running `browser-server` (e.g. http://127.0.0.1:9222) instead of launching Chromium")
+    run_parser.add_argument("--delay", type=float, default=0.5, help="Delay between field inputs (seconds)")
+    run_parser.add_argument("--between-forms-delay", type=float, default=2, help="Delay between forms (seconds)")
+    run_parser.add_argument("--max-retries", type=int, default=3, help="Max retries on failure")
+    run_parser.add_argument("--max-entries", type=int, default=0, help="Number of entries to process (0 for all)")
+    run_parser.add_argument("--workers", type=int, default=1,
+                            help="Fill the file in N parallel browser contexts sharing one Chromium "
+                                 "(with --async: N pages on one event loop)")
+    run_parser.add_argument("--chunk-size", type=int, default=10000,
+                            help="Rows read from the data file at a time")
+    run_parser.add_argument("--resume", action="store_true",
+                            help="Skip entries already finished according to the checkpoint journal (<file>.journal)")
+    run_parser.add_argument("--requeue-failed", action="store_true",
+                            help="With --resume, process entries that failed in earlier runs again")
+    run_parser.add_argument("--no-session-cache", dest="session_cache", action="store_false",
+                            help="Always run the login flow instead of reusing a saved session")
+    run_parser.add_argument("--session-ttl", type=float, default=12,
+                            help="Hours a saved login session is reused before logging in again")
+    run_parser.add_argument("--adaptive-pacing", action="store_true",
+                            help="Wait on page readiness and adapt the delay between entries to errors and latency "
+                                 "instead of using the fixed delays")
+    run_parser.add_argument("--target-rpm", type=float, default=0,
+                            help="Upper limit on entries started per minute across all workers (0 for no limit)")
+    run_parser.add_argument("--log-level", choices=list(LOG_LEVELS), default="entry",
+                            help="Log every field, one line per entry, or only errors")
+    run_parser.add_argument("--mapping", metavar="JSON",
+                            help="Form mapping file (columns to element offsets, stride, select matching); "
+                                 "defaults to the built-in layout")
+    run_parser.add_argument("--block-profile", metavar="PROFILE", default="off",
+                            help="Requests to abort while loading pages: 'off', 'default' (images, media, fonts "
+                                 "and common trackers) or a JSON profile file")
+    run_parser.add_argument("--invalid-rows", choices=PREFLIGHT_MODES, default="quarantine",
+                            help="What to do with entries that fail the pre-flight checks (bad gender, age or ID): "
+                                 "skip them, only report them, or turn the checks off")
+    run_parser.add_argument("--id-pattern", default=ID_PATTERN,
+                            help="Regular expression the ID column must match (empty to skip the check)")
+    run_parser.add_argument("--dedupe", action="store_true",
+                            help="Skip entries whose content was already submitted to this URL in an earlier run, "
+                                 "from any data file")
+    run_parser.add_argument("--dedupe-index", default=SUBMITTED_INDEX_PATH, metavar="FILE",
+                            help="SQLite index of submitted entries used by --dedupe")
+    run_parser.add_argument("--window", type=int, default=0, metavar="N",
+                            help="Submit the form after every N entries and reload it empty, so the form "
+                                 "never grows past N blocks (0: fill everything into one form, never submit)")
+    run_parser.add_argument("--replay", action="store_true",
+                            help="Record the form's submit request once in the browser, then post entries over HTTP")
+    run_parser.add_argument("--replay-concurrency", type=int, default=4, metavar="N",
+                            help="Posts in flight at once with --replay")
+    run_parser.add_argument("--replay-success", metavar="TEXT",
+                            help="Text a successful post's response must contain with --replay")
+    run_parser.add_argument("--lookahead", type=int, default=0, metavar="K",
+                            help="Wait for the next K form blocks in the page while the current one is filled")
+    run_parser.add_argument("--trace-failures", metavar="DIR",
+                            help="Save a Playwright trace of every entry that fails all its attempts to DIR")
+    run_parser.add_argument("--trace-keep", type=int, default=5, metavar="K",
+                            help="Failed attempts whose traces are kept until their entry is given up on")
+    run_parser.add_argument("--queue-batch", type=int, default=50, metavar="N",
+                            help="Rows claimed from --queue at a time")
+    run_parser.add_argument("--lease", type=float, default=300, metavar="SECONDS",
+                            help="How long claimed rows stay reserved without a sign of life from this worker")
+    run_parser.add_argument("--queue-no-wal", dest="queue_wal", action="store_false",
+                            help="Use SQLite's rollback journal for --queue, for a queue file on a network share")
+    run_parser.add_argument("--retry-backoff", type=float, default=2.0,
+                            help="Seconds before the first retry of a timed-out entry; doubles with each attempt")
+    run_parser.add_argument("--dead-letter", metavar="FILE",
+                            help="CSV for entries that were given up on (default: <csv>.failed.csv)")
+    run_parser.add_argument("--metrics-prom", metavar="FILE",
+                            help="Write stage timing histograms and counters here in Prometheus text format")
+    run_parser.add_argument("--metrics-jsonl", metavar="FILE",
+                            help="Append a JSON snapshot of the metrics here every --metrics-interval seconds")
+    run_parser.add_argument("--metrics-interval", type=float, default=10,
+                            help="Seconds between progress readouts and metrics snapshots")
+    run_parser.add_argument("--batch-fill", action="store_true",
+                            help="Set all fields of a form block in one call, falling back to per-field filling")
+    run_parser.add_argument("--async", dest="use_async", action="store_true",
+                            help="Use the asyncio engine built on playwright.async_api")
+    run_parser.add_argument("--max-in-flight", type=int, default=None,
+                            help="Row fills awaiting the browser at once with --async (default and limit without "
+                                 "--batch-fill: one per page)")
+
+    check_parser = subparsers.add_parser("check", help="Only run the pre-flight checks on a data file")
+    check_parser.add_argument("--csv", "--data", dest="file_path", required=True, help="Data file to check")
+    check_parser.add_argument("--file-type", choices=sorted(set(FILE_TYPES.values())),
+                              help="Data file format (default: from the file extension)")
+    check_parser.add_argument("--id-pattern", default=ID_PATTERN,
+                              help="Regular expression the ID column must match (empty to skip the check)")
+    check_parser.add_argument("--max-entries", type=int, default=0, help="Number of entries to check (0 for all)")
+    check_parser.add_argument("--chunk-size", type=int, default=10000, help="Rows read from the data file at a time")
+
+    server_parser = subparsers.add_parser("browser-server",
+                                          help="Keep one Chromium running for runs to attach to with --browser-endpoint")
+    server_parser.add_argument("--port", type=int, default=9222, help="CDP port to listen on (localhost only)")
+    server_parser.add_argument("--headless", action="store_true", help="Run Chromium without a window")
+
+    queue_parser = subparsers.add_parser("queue", help="Load a data file into a job queue for `run --queue` workers")
+    queue_parser.add_argument("action", choices=["load", "stats", "requeue"])
+    queue_parser.add_argument("--queue", required=True, metavar="FILE", help="Job queue file")
+    queue_parser.add_argument("--csv", "--data", dest="file_path", help="Data file to load (load)")
+    queue_parser.add_argument("--file-type", choices=sorted(set(FILE_TYPES.values())),
+                              help="Data file format (default: from the file extension)")
+    queue_parser.add_argument("--max-entries", type=int, default=0, help="Number of entries to load (0 for all)")
+    queue_parser.add_argument("--chunk-size", type=int, default=10000, help="Rows read from the data file at a time")
+    queue_parser.add_argument("--invalid-rows", choices=PREFLIGHT_MODES, default="quarantine",
+                              help="Whether entries failing the pre-flight checks are loaded")
+    queue_parser.add_argument("--id-pattern", default=ID_PATTERN,
+                              help="Regular expression the ID column must match (empty to skip the check)")
+    queue_parser.add_argument("--leased", action="store_true",
+                              help="requeue: also hand out rows currently leased (use when all workers are stopped)")
+    queue_parser.add_argument("--no-wal", dest="queue_wal", action="store_false",
+                              help="Use SQLite's rollback journal, for a queue file on a network share")
+
+    index_parser = subparsers.add_parser("index", help="Inspect or prune the index of submitted entries (--dedupe)")
+    index_parser.add_argument("action", choices=["stats", "prune"])
+    index_parser.add_argument("--index", default=SUBMITTED_INDEX_PATH, metavar="FILE", help="Index file")
+    index_parser.add_argument("--site", help="Only prune entries submitted to this URL")
+    index_parser.add_argument("--older-than", type=float, metavar="DAYS", help="Only prune entries older than this")
+    index_parser.add_argument("--all", action="store_true", help="Prune every entry")
+    return parser
+
+
+def cli_log(message):
+    print(f"{datetime.now().strftime('%H:%M:%S')} - {message}", flush=True)
+
+
+def cli_prompt(kind, message):
+    if not sys.stdin.isatty():
+        return kind == PROMPT_CONFIRM_LOGIN
+    if kind == PROMPT_CONFIRM_LOGIN:
+        return input(f"{message} [y/N] ").strip().lower() in ("y", "yes")
+    input(f"{message} Press Enter to continue.")
+    return True
+
+
+def run_cli(args):
+    engine_class = AsyncFormFillerEngine if args.use_async else FormFillerEngine
+    options = {'max_in_flight': args.max_in_flight} if args.use_async else {}
+    engine = engine_class(
+        file_path=args.file_path or args.queue,
+        file_type=args.file_type,
+        website_url=args.url,
+        password=args.password,
+        delay_time=args.delay,
+        between_forms_delay=args.between_forms_delay,
+        max_retries=args.max_retries,
+        max_entries_to_process=args.max_entries,
+        headless=args.headless,
+        browser_endpoint=args.browser_endpoint,
+        workers=args.workers,
+        batch_fill=args.batch_fill,
+        chunk_size=args.chunk_size,
+        resume=args.resume,
+        requeue_failed=args.requeue_failed,
+        session_cache=args.session_cache,
+        session_ttl=args.session_ttl * 3600,
+        adaptive_pacing=args.adaptive_pacing,
+        target_rpm=args.target_rpm,
+        log_level=args.log_level,
+        mapping_file=args.mapping,
+        block_profile=args.block_profile,
+        metrics_prom=args.metrics_prom,
+        metrics_jsonl=args.metrics_jsonl,
+        metrics_interval=args.metrics_interval,
+        retry_backoff=args.retry_backoff,
+        dead_letter_file=args.dead_letter,
+        preflight=args.invalid_rows,
+        id_pattern=args.id_pattern,
+        dedupe=args.dedupe,
+        dedupe_index=args.dedupe_index,
+        window_size=args.window,
+        job_queue=args.queue,
+        queue_batch=args.queue_batch,
+        lease_seconds=args.lease,
+        queue_wal=args.queue_wal,
+        replay=args.replay,
+        replay_concurrency=args.replay_concurrency,
+        replay_success=args.replay_success,
+        trace_dir=args.trace_failures,
+        trace_keep=args.trace_keep,
+        lookahead=args.lookahead,
+        log_callback=cli_log,
+        status_callback=None,
+        prompt_callback=cli_prompt,
+        **options
+    )
+    try:
+        summary = engine.run()
+    except KeyboardInterrupt:
+        cli_log("Interrupted by user")
+        return 130
+    except Exception as e:
+        cli_log(f"Automation error: {str(e)}")
+        return 1
+
+    cli_log(f"Form filling completed. Successful: {summary['success']}, Failed: {summary['failure']}")
+    if summary['stopped'] or summary['failure']:
+        return 1
+    return 0
+
+
+def check_cli(args):
+    engine = FormFillerEngine(file_path=args.file_path, file_type=args.file_type, website_url="",
+                              max_entries_to_process=args.max_entries,
+                              chunk_size=args.chunk_size, id_pattern=args.id_pattern, log_callback=cli_log)
+    try:
+        result = engine.check_data()
+    except Exception as e:
+        cli_log(f"Could not check data file: {str(e)}")
+        return 1
+    return 1 if result['invalid'] else 0
+
+
+def browser_server_cli(args):
+    # Runs attach over CDP and only ever close their own contexts, so this Chromium
+    # stays warm between jobs until the server is stopped
+    with sync_api.sync_playwright() as playwright:
+        browser = playwright.chromium.launch(headless=args.headless,
+                                             args=[f"--remote-debugging-port={args.port}",
+                                                   "--remote-debugging-address=127.0.0.1"])
+        cli_log(f"Browser server running; attach with --browser-endpoint http://127.0.0.1:{args.port} "
+                f"(Ctrl+C to stop)")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            cli_log("Stopping browser server")
+        finally:
+            if browser.is_connected():
+                browser.close()
+    return 0
+
+
+def queue_cli(args):
+    if args.action == "load":
+        if not args.file_path:
+            cli_log("Give the data file to load with --csv")
+            return 1
+        engine = FormFillerEngine(file_path=args.file_path, file_type=args.file_type, website_url="",
+                                  max_entries_to_process=args.max_entries, chunk_size=args.chunk_size,
+                                  preflight=args.invalid_rows, id_pattern=args.id_pattern,
+                                  job_queue=args.queue, queue_wal=args.queue_wal, log_callback=cli_log)
+        try:
+            engine.load_queue()
+        except Exception as e:
+            cli_log(f"Could not load job queue: {str(e)}")
+            return 1
+        return 0
+
+    if not os.path.exists(args.queue):
+        cli_log(f"No job queue at {args.queue}")
+        return 1
+    job_queue = JobQueue(args.queue, wal=args.queue_wal).open()
+    try:
+        if args.action == "requeue":
+            statuses = ('failed', 'leased') if args.leased else ('failed',)
+            cli_log(f"Requeued {job_queue.requeue(statuses)} entries")
+        counts, owners = job_queue.stats()
+        cli_log(f"{job_queue.meta('source')}: " + ', '.join(f"{count} {status}" for status, count in counts.items()))
+        for owner, count, expires in owners:
+            state = "expired" if expires < time.time() else f"until {datetime.fromtimestamp(expires):%H:%M:%S}"
+            cli_log(f"  {owner}: {count} leased, {state}")
+        return 0
+    finally:
+        job_queue.close()
+
+
+def index_cli(args):
+    if not os.path.exists(args.index):
+        cli_log(f"No index at {args.index}")
+        return 0 if args.action == "stats" else 1
+    index = SubmittedIndex(args.index).open()
+    try:
+        if args.action == "stats":
+            for site, count, first, last in index.stats():
+                cli_log(f"{site}: {count} entries, {datetime.fromtimestamp(first):%Y-%m-%d %H:%M} "
+                        f"to {datetime.fromtimestamp(last):%Y-%m-%d %H:%M}")
+            return 0
+        if args.site is None and args.older_than is None and not args.all:
+            cli_log("Give --site, --older-than or --all to choose what to prune")
+            return 1
+        before = time.time() - args.older_than * 86400 if args.older_than is not None else None
+        cli_log(f"Pruned {index.prune(site=args.site, before=before)} entries from {args.index}")
+        return 0
+    finally:
+        index.close()
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    setup_logging()
+    if args.command == "run":
+        return run_cli(args)
+    if args.command == "check":
+        return check_cli(args)
+    if args.command == "index":
+        return index_cli(args)
+    if args.command == "queue":
+        return queue_cli(args)
+    if args.command == "browser-server":
+        return browser_server_cli(args)
+
     root = tk.Tk()
     app = FormFillerApp(root)
-    root.mainloop()
\ No newline at end of file
+    root.mainloop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())